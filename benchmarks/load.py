@@ -0,0 +1,274 @@
+"""
+Offline load test for the chat endpoints.
+
+    python benchmarks/load.py --users 20 --seconds 30 --llm-latency 0.5 --llm-token-rate 50
+
+Boots the project in a separate server process (threaded WSGI server, LLM job
+workers, a fresh SQLite database seeded with --seed-posts posts) against the
+local fake LLM, then drives concurrent users. Each user loads / and posts
+to /addpage, and after each post waits for the bot answer through /jobs/<id>.
+
+Reported per endpoint: throughput, p50/p95/p99 latency, errors and SQL
+queries per request (counted inside the server). Also reported: the
+end-to-end answer latency and the server process memory. The report is
+written as JSON to --output so runs can be compared.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+
+def serve(port, workers):
+    """
+    Server process: run migrations, start the LLM workers and serve the WSGI app.
+    """
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+    seed(int(os.environ['LOAD_SEED_POSTS']))
+
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connections
+
+    from task1.jobs import run_workers
+
+    application = get_wsgi_application()
+
+    def counted(environ, start_response):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        def start(status, headers, exc_info=None):
+            return start_response(status, headers + [(QUERY_COUNT_HEADER, str(len(queries)))], exc_info)
+
+        wrappers = [connections[alias].execute_wrapper(count) for alias in connections]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        try:
+            return application(environ, start)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+        request_queue_size = 128
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    threading.Thread(target=run_workers, args=(workers, 0.05), daemon=True).start()
+    server = make_server('127.0.0.1', port, counted, ThreadingWSGIServer, QuietHandler)
+    print('ready', flush=True)
+    server.serve_forever()
+
+
+def seed(count):
+    from django.utils import timezone as django_timezone
+
+    from task1.identities import default_conversation, get_bot, get_me
+    from task1.models import Post
+
+    if count <= 0 or Post.objects.exists():
+        return
+    me, bot, conversation = get_me(), get_bot(), default_conversation()
+    now = django_timezone.now()
+    Post.objects.bulk_create(
+        (Post(author=me if i % 2 == 0 else bot, conversation=conversation, text=f'seed message {i}',
+              token_count=3, published_date=now - timedelta(seconds=count - i))
+         for i in range(count)),
+        batch_size=1000,
+    )
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None}
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'mean': statistics.mean(values) * 1000}
+
+
+class User:
+    def __init__(self, base_url, stats, lock):
+        self.base_url = base_url
+        self.stats = stats
+        self.lock = lock
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.csrf_token = None
+        self.sent = 0
+
+    def request(self, name, path, data=None, headers=None):
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers or {})
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                body = response.read()
+                queries = response.headers.get(QUERY_COUNT_HEADER)
+        except (urllib.error.URLError, OSError):
+            self.record(name, None, None)
+            return None
+        self.record(name, time.perf_counter() - started, queries)
+        return body
+
+    def record(self, name, elapsed, queries):
+        with self.lock:
+            stats = self.stats.setdefault(name, {'latencies': [], 'queries': [], 'errors': 0})
+            if elapsed is None:
+                stats['errors'] += 1
+                return
+            stats['latencies'].append(elapsed)
+            if queries is not None:
+                stats['queries'].append(int(queries))
+
+    def home(self):
+        body = self.request('home', '/')
+        if body:
+            match = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', body)
+            self.csrf_token = match.group(1).decode() if match else self.csrf_token
+
+    def addpage(self):
+        self.sent += 1
+        started = time.perf_counter()
+        data = urllib.parse.urlencode({'field_text': f'question {id(self)} {self.sent}',
+                                       'csrfmiddlewaretoken': self.csrf_token}).encode()
+        body = self.request('addpage', '/addpage', data, {'Accept': 'application/json',
+                                                          'Referer': self.base_url + '/'})
+        if not body:
+            return
+        poll = json.loads(body)['poll']
+        while True:
+            status = self.request('job_status', poll + '?timeout=10')
+            if status is None:
+                return
+            if json.loads(status)['status'] in ('done', 'failed'):
+                break
+        self.record('answer', time.perf_counter() - started, None)
+
+    def run(self, deadline):
+        while time.monotonic() < deadline:
+            self.home()
+            if self.csrf_token:
+                self.addpage()
+
+
+def process_memory(pid):
+    status = Path(f'/proc/{pid}/status')
+    if not status.exists():
+        return None
+    fields = dict(line.split(':', 1) for line in status.read_text().splitlines() if ':' in line)
+    return {key.lower(): int(fields[key].split()[0]) // 1024 for key in ('VmRSS', 'VmHWM') if key in fields}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10, help='Concurrent simulated users')
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=4, help='LLM job worker threads')
+    parser.add_argument('--seed-posts', type=int, default=10000)
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='Fake LLM time to first token, s')
+    parser.add_argument('--llm-token-rate', type=float, default=100, help='Fake LLM tokens per second')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--settings', default='pythonProject.settings_production')
+    parser.add_argument('--output', default='load-results.json')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.workers)
+        return
+
+    from task1.fake_llm import start_in_thread
+
+    llm = start_in_thread(port=0, latency=args.llm_latency, token_rate=args.llm_token_rate)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': args.settings,
+            'DJANGO_ALLOWED_HOSTS': '127.0.0.1',
+            'PYTHONPATH': os.pathsep.join(filter(None, [str(ROOT), os.environ.get('PYTHONPATH')])),
+            'SQLITE_PATH': str(Path(tmp) / 'load.sqlite3'),
+            'LLM_BASE_URL': 'http://%s:%d/v1' % llm.server_address,
+            'LLM_API_KEY': 'fake',  # фейковый сервер ключ не проверяет
+            'LOAD_SEED_POSTS': str(args.seed_posts),
+            # Все пользователи теста приходят с одного адреса
+            'ADMISSION_RATE': os.environ.get('ADMISSION_RATE', '1000'),
+            'ADMISSION_BURST': os.environ.get('ADMISSION_BURST', '1000'),
+        }
+        server = subprocess.Popen([sys.executable, __file__, '--serve', '--port', str(args.port),
+                                   '--workers', str(args.workers)],
+                                  cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+        try:
+            if server.stdout.readline().strip() != 'ready':
+                sys.exit('server failed to start')
+
+            stats, lock = {}, threading.Lock()
+            base_url = f'http://127.0.0.1:{args.port}'
+            deadline = time.monotonic() + args.seconds
+            users = [User(base_url, stats, lock) for _ in range(args.users)]
+            threads = [threading.Thread(target=user.run, args=(deadline,)) for user in users]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            memory = process_memory(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+        llm.shutdown()
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'config': {key: value for key, value in vars(args).items() if key != 'serve'},
+        'duration_sec': elapsed,
+        'server_memory_mb': memory,
+        'endpoints': {
+            name: {
+                'requests': len(data['latencies']),
+                'errors': data['errors'],
+                'throughput_rps': len(data['latencies']) / elapsed,
+                'latency_ms': percentiles(data['latencies']),
+                'queries_per_request': statistics.mean(data['queries']) if data['queries'] else None,
+            }
+            for name, data in sorted(stats.items())
+        },
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    Path(args.output).write_text(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Mixed read/write throughput of the SQLite storage, before and after tuning.
+
+    python benchmarks/sqlite_mixed.py --readers 8 --writers 4 --seconds 10
+
+"default" is how Django opened the database before: rollback journal,
+synchronous=FULL and DEFERRED transactions. "tuned" uses settings.SQLITE_JOURNAL_MODE
+(WAL) and SQLITE_PRAGMAS (synchronous=NORMAL, mmap, busy_timeout), BEGIN IMMEDIATE for writers
+and read-only connections for readers. Readers load the newest chat page;
+writers store a user/bot post pair in one transaction, the same way addpage
+and the job workers do.
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pythonProject.settings import SQLITE_JOURNAL_MODE, SQLITE_PRAGMAS
+
+SCHEMA = '''
+CREATE TABLE task1_post (
+    id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+    text varchar(200) NOT NULL,
+    published_date datetime NULL,
+    author_id integer NOT NULL,
+    token_count integer unsigned NULL,
+    conversation_id bigint NULL
+);
+CREATE INDEX post_published_id_idx ON task1_post (published_date, id);
+CREATE INDEX post_conv_published_id_idx ON task1_post (conversation_id, published_date, id);
+'''
+
+PAGE_QUERY = ('SELECT id, text, published_date, author_id FROM task1_post WHERE conversation_id = 1 '
+              'ORDER BY published_date DESC, id DESC LIMIT 51')
+INSERT = ('INSERT INTO task1_post (text, published_date, author_id, token_count, conversation_id) '
+          'VALUES (?, ?, ?, ?, 1)')
+
+PROFILES = {
+    'default': {'pragmas': {}, 'begin': 'BEGIN', 'readonly': False, 'timeout': 5.0},
+    'tuned': {'pragmas': {'journal_mode': SQLITE_JOURNAL_MODE, **SQLITE_PRAGMAS}, 'begin': 'BEGIN IMMEDIATE', 'readonly': True, 'timeout': 5.0},
+}
+
+
+def connect(path, profile, readonly=False):
+    uri = f'file:{path}?mode=ro' if readonly else f'file:{path}'
+    conn = sqlite3.connect(uri, uri=True, timeout=profile['timeout'], isolation_level=None,
+                           check_same_thread=False)
+    for name, value in profile['pragmas'].items():
+        if not (readonly and name == 'journal_mode'):
+            conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+
+def prepare(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    now = time.time()
+    conn.executemany(INSERT, ((f'message {i}', now - rows + i, 1 + i % 2, 3) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def reader(path, profile, stop, counters):
+    conn = connect(path, profile, readonly=profile['readonly'])
+    while not stop.is_set():
+        try:
+            conn.execute(PAGE_QUERY).fetchall()
+            counters['reads'] += 1
+        except sqlite3.OperationalError:
+            counters['read_errors'] += 1
+    conn.close()
+
+
+def writer(path, profile, stop, counters):
+    conn = connect(path, profile)
+    while not stop.is_set():
+        try:
+            conn.execute(profile['begin'])
+            conn.execute('SELECT max(id) FROM task1_post').fetchone()
+            conn.execute(INSERT, ('question', time.time(), 1, 2))
+            conn.execute(INSERT, ('answer', time.time(), 2, 2))
+            conn.execute('COMMIT')
+            counters['writes'] += 1
+        except sqlite3.OperationalError:
+            counters['write_errors'] += 1
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+    conn.close()
+
+
+def run(profile_name, args):
+    profile = PROFILES[profile_name]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / 'bench.sqlite3')
+        prepare(path, args.rows)
+        # Режим журнала сохраняется в файле БД, включаем его до старта читателей
+        connect(path, profile).close()
+
+        stop = threading.Event()
+        per_thread = []
+        threads = []
+        for target, count in ((reader, args.readers), (writer, args.writers)):
+            for _ in range(count):
+                counters = {'reads': 0, 'read_errors': 0, 'writes': 0, 'write_errors': 0}
+                per_thread.append(counters)
+                threads.append(threading.Thread(target=target, args=(path, profile, stop, counters)))
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    totals = {key: sum(counters[key] for counters in per_thread) for key in per_thread[0]}
+    return {
+        'profile': profile_name,
+        'reads_per_sec': totals['reads'] / args.seconds,
+        'writes_per_sec': totals['writes'] / args.seconds,
+        'read_errors': totals['read_errors'],
+        'write_errors': totals['write_errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append',
+                        help='Profiles to run (default: all)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    results = [run(name, args) for name in args.profile or ['default', 'tuned']]
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+
+
+if __name__ == '__main__':
+    main()
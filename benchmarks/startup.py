@@ -0,0 +1,85 @@
+"""
+Cold start benchmark: time from spawning a worker process to its first handled request.
+
+    python benchmarks/startup.py --runs 10 --budget-ms 1500
+
+Each run starts a fresh interpreter that loads the WSGI application and sends
+GET / through the full middleware stack. Exits with status 1 when the median
+total time is over --budget-ms.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = '''
+import json, sys, time
+spawned = float(sys.argv[1])
+started = time.time()
+
+from django.core.wsgi import get_wsgi_application
+from wsgiref.util import setup_testing_defaults
+
+application = get_wsgi_application()
+ready = time.time()
+
+environ = {'PATH_INFO': sys.argv[2]}
+setup_testing_defaults(environ)
+status = []
+body = b''.join(application(environ, lambda s, h, exc_info=None: status.append(s)))
+done = time.time()
+
+print(json.dumps({
+    'status': status[0],
+    'interpreter_ms': (started - spawned) * 1000,
+    'setup_ms': (ready - started) * 1000,
+    'first_request_ms': (done - ready) * 1000,
+    'total_ms': (done - spawned) * 1000,
+}))
+'''
+
+
+def run_once(settings, path):
+    python_path = os.pathsep.join(filter(None, [str(ROOT), os.environ.get('PYTHONPATH')]))
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings, 'PYTHONPATH': python_path}
+    result = subprocess.run([sys.executable, '-c', CHILD, str(time.time()), path],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode:
+        sys.exit(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--settings', default='pythonProject.settings_production')
+    parser.add_argument('--path', default='/')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=None)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    runs = [run_once(args.settings, args.path) for _ in range(args.runs)]
+    report = {'settings': args.settings, 'path': args.path, 'runs': len(runs), 'status': runs[-1]['status']}
+    for key in ('interpreter_ms', 'setup_ms', 'first_request_ms', 'total_ms'):
+        values = [run[key] for run in runs]
+        report[key] = {'median': statistics.median(values), 'max': max(values)}
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+
+    if args.budget_ms is not None and report['total_ms']['median'] > args.budget_ms:
+        print(f"over budget: median {report['total_ms']['median']:.0f} ms > {args.budget_ms:.0f} ms",
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
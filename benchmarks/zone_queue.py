@@ -0,0 +1,88 @@
+"""
+Cost of ZoneQueue operations and of polling its health metrics.
+
+    python benchmarks/zone_queue.py --ops 200000
+
+Measures enqueue + dequeue round trips with every zone kept half full, the
+same round trips while another thread polls get_health_status() in a tight
+loop, and the cost of a single get_health_status() snapshot.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from test10 import ZoneQueue, ZoneType
+
+# Элементы переиспользуются весь прогон: таймауты такие, чтобы ничего не истекло
+NO_EXPIRY = {'red_timeout': 10 ** 9, 'yellow_timeout': 10 ** 9, 'green_timeout': 10 ** 9}
+
+
+def make_item(i):
+    return {'id': str(i), 'type': 'TRADE', 'data': {}, 'timestamp': time.time() * 1000}
+
+
+def prefill(queue):
+    for zone in ZoneType:
+        for i in range(queue.max_zone_size[zone] // 2):
+            queue.enqueue(make_item(i), zone)
+
+
+def round_trips(queue, ops):
+    zones = list(ZoneType)
+    items = [make_item(i) for i in range(1000)]
+    started = time.perf_counter()
+    for i in range(ops):
+        queue.enqueue(items[i % 1000], zones[i % 3])
+        queue.dequeue()
+    return (time.perf_counter() - started) / ops * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ops', type=int, default=200000)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    queue = ZoneQueue(**NO_EXPIRY)
+    prefill(queue)
+    round_trip_ns = round_trips(queue, args.ops)
+
+    stop = threading.Event()
+    polls = [0]
+
+    def poll():
+        while not stop.is_set():
+            queue.get_health_status()
+            polls[0] += 1
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    polled_round_trip_ns = round_trips(queue, args.ops)
+    stop.set()
+    poller.join()
+
+    started = time.perf_counter()
+    for _ in range(args.ops):
+        queue.get_health_status()
+    snapshot_us = (time.perf_counter() - started) / args.ops * 1e6
+
+    report = {
+        'ops': args.ops,
+        'enqueue_dequeue_ns': round_trip_ns,
+        'enqueue_dequeue_while_polling_ns': polled_round_trip_ns,
+        'health_polls_during_run': polls[0],
+        'health_snapshot_us': snapshot_us,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Throughput of ZoneQueue batch operations against the single-item ones.
+
+    python benchmarks/zone_queue_batch.py --items 300000 --batch-sizes 10 100 1000
+
+Pushes the same items through the queue with enqueue()/dequeue() and with
+enqueue_many()/dequeue_batch() at every batch size, and reports items per
+second for each path. Both paths must hand out the same items in the same
+order; otherwise the script exits with status 1.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from test10 import ZoneQueue, ZoneType
+
+ZONES = list(ZoneType)
+# Элементы создаются заранее: таймауты такие, чтобы ничего не истекло за прогон
+NO_EXPIRY = {'red_timeout': 10 ** 9, 'yellow_timeout': 10 ** 9, 'green_timeout': 10 ** 9}
+
+
+def make_items(count):
+    now = time.time() * 1000
+    return [{'id': str(i), 'type': 'TRADE', 'data': {}, 'timestamp': now} for i in range(count)]
+
+
+def new_queue(size):
+    return ZoneQueue(max_zone_size={zone: size for zone in ZoneType}, **NO_EXPIRY)
+
+
+def single(items, chunk):
+    queue = new_queue(chunk)
+    out = []
+    started = time.perf_counter()
+    for start in range(0, len(items), chunk):
+        zone = ZONES[start // chunk % 3]
+        for item in items[start:start + chunk]:
+            queue.enqueue(item, zone)
+        while (item := queue.dequeue()) is not None:
+            out.append(item)
+    return time.perf_counter() - started, out
+
+
+def batched(items, chunk, batch_size):
+    queue = new_queue(chunk)
+    out = []
+    started = time.perf_counter()
+    for start in range(0, len(items), chunk):
+        zone = ZONES[start // chunk % 3]
+        for offset in range(start, min(start + chunk, len(items)), batch_size):
+            queue.enqueue_many(items[offset:min(offset + batch_size, start + chunk)], zone)
+        while batch := queue.dequeue_batch(batch_size):
+            out.extend(batch)
+    return time.perf_counter() - started, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=300000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--chunk', type=int, default=1000, help='Items enqueued before the queue is drained')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    elapsed, expected = single(items, args.chunk)
+    results = [{'path': 'enqueue/dequeue', 'items_per_sec': len(items) / elapsed, 'errors': []}]
+    for batch_size in args.batch_sizes:
+        elapsed, out = batched(items, args.chunk, batch_size)
+        errors = [] if [item['id'] for item in out] == [item['id'] for item in expected] else [
+            'batch path handed out different items or order']
+        results.append({'path': f'enqueue_many/dequeue_batch({batch_size})',
+                        'items_per_sec': len(items) / elapsed, 'errors': errors})
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+    sys.exit(1 if any(result['errors'] for result in results) else 0)
+
+
+if __name__ == '__main__':
+    main()
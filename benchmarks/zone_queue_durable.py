@@ -0,0 +1,113 @@
+"""
+Write overhead and recovery time of DurableZoneQueue.
+
+    python benchmarks/zone_queue_durable.py --items 1000000 --log-dir /tmp/zone-queue-log
+
+Enqueues `--items` items and dequeues them again with a plain ZoneQueue and
+with DurableZoneQueue (group commit every `--commit-interval` seconds), and
+reports the cost per operation of each. The commit-per-operation mode is
+measured on `--sync-items` items only, as it waits for the disk every time.
+Then recovery is timed with all the items queued: by replaying the log, and
+from a snapshot after compaction. The recovered queue must hold the same
+items and health counters; otherwise the script exits with status 1.
+"""
+import argparse
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from test10 import DurableZoneQueue, ZoneQueue, ZoneType
+
+NO_EXPIRY = {'red_timeout': 10 ** 9, 'yellow_timeout': 10 ** 9, 'green_timeout': 10 ** 9}
+ZONES = list(ZoneType)
+
+
+def make_items(count):
+    now = time.time() * 1000
+    return [{'id': str(i), 'type': 'TRADE', 'data': {'n': i}, 'timestamp': now} for i in range(count)]
+
+
+def options(items):
+    return {'max_zone_size': {zone: items for zone in ZoneType}, **NO_EXPIRY}
+
+
+def round_trip(queue, items):
+    started = time.perf_counter()
+    for i, item in enumerate(items):
+        queue.enqueue(item, ZONES[i % 3])
+    enqueued = time.perf_counter()
+    while queue.dequeue() is not None:
+        pass
+    finished = time.perf_counter()
+    return {'enqueue_us': (enqueued - started) / len(items) * 1e6,
+            'dequeue_us': (finished - enqueued) / len(items) * 1e6}
+
+
+def state(queue):
+    return queue.get_health_status(), {zone: queue.queues[zone].items() for zone in ZoneType}
+
+
+def recover(log_dir, items, expected):
+    started = time.perf_counter()
+    queue = DurableZoneQueue(log_dir, **options(items))
+    elapsed = time.perf_counter() - started
+    matches = state(queue) == expected
+    return queue, {'seconds': elapsed, 'records_replayed': queue.recovery_stats['records'], 'matches': matches}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--sync-items', type=int, default=20000)
+    parser.add_argument('--commit-interval', type=float, default=0.01)
+    parser.add_argument('--log-dir', default='zone-queue-log', help='Emptied before every run')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    log_dir = Path(args.log_dir)
+    items = make_items(args.items)
+    report = {'items': args.items, 'memory': round_trip(ZoneQueue(**options(args.items)), items)}
+
+    shutil.rmtree(log_dir, ignore_errors=True)
+    with DurableZoneQueue(log_dir, commit_interval=args.commit_interval, **options(args.items)) as queue:
+        report['group_commit'] = round_trip(queue, items)
+
+    shutil.rmtree(log_dir, ignore_errors=True)
+    with DurableZoneQueue(log_dir, commit_interval=0, **options(args.items)) as queue:
+        report['commit_per_operation'] = round_trip(queue, items[:args.sync_items])
+
+    for mode in ('group_commit', 'commit_per_operation'):
+        for operation in ('enqueue_us', 'dequeue_us'):
+            report[mode][operation.replace('_us', '_overhead')] = (
+                report[mode][operation] / report['memory'][operation])
+
+    # Восстановление: все элементы в очереди, сначала из журнала, потом из снимка
+    shutil.rmtree(log_dir, ignore_errors=True)
+    queue = DurableZoneQueue(log_dir, commit_interval=args.commit_interval, compact_after=10 ** 6,
+                             **options(args.items))
+    for i, item in enumerate(items):
+        queue.enqueue(item, ZONES[i % 3])
+    expected = state(queue)
+    queue.close()
+    queue, report['recovery_from_log'] = recover(log_dir, args.items, expected)
+    queue.compact()
+    queue.close()
+    queue, report['recovery_from_snapshot'] = recover(log_dir, args.items, expected)
+    queue.close()
+    report['log_bytes'] = sum(path.stat().st_size for path in log_dir.iterdir())
+    shutil.rmtree(log_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+    failed = not (report['recovery_from_log']['matches'] and report['recovery_from_snapshot']['matches'])
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
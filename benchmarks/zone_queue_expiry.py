@@ -0,0 +1,136 @@
+"""
+Cost of ZoneQueue expiry as the queue grows.
+
+    python benchmarks/zone_queue_expiry.py --depths 1000 10000 100000 --expiring 100
+
+For every depth, each zone is filled with live items whose timestamps are
+shuffled (out of order), and `--expiring` already expired items are mixed in
+at random positions. Reports the time of one cleanup_expired() call, which
+must not grow with the depth, and checks that it removed exactly the expired
+items, that none is left behind and that dequeue never hands one out. Then
+runs ThreadSafeZoneQueue's background reaper and reports how long after its
+deadline an item is reaped. Exits with status 1 on a failed check.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from test10 import ThreadSafeZoneQueue, ZoneQueue, ZoneType
+
+TIMEOUT_MS = 60000
+
+
+def make_item(i, timestamp):
+    return {'id': str(i), 'type': 'TRADE', 'data': {}, 'timestamp': timestamp}
+
+
+def fill(depth, expiring, rng):
+    queue = ZoneQueue(red_timeout=TIMEOUT_MS, yellow_timeout=TIMEOUT_MS, green_timeout=TIMEOUT_MS,
+                      max_zone_size={zone: depth + expiring for zone in ZoneType})
+    now = time.time() * 1000
+    expired_ids = set()
+    for zone in ZoneType:
+        items = [make_item(f'{zone.name}-{i}', now - rng.uniform(0, TIMEOUT_MS / 2)) for i in range(depth)]
+        for i in range(expiring):
+            item = make_item(f'{zone.name}-expired-{i}', now - TIMEOUT_MS - rng.uniform(1, 1000))
+            items.insert(rng.randrange(len(items) + 1), item)
+            expired_ids.add(item['id'])
+        for item in items:
+            queue.enqueue(item, zone)
+    return queue, expired_ids
+
+
+def measure(depth, expiring, rng):
+    errors = []
+    queue, expired_ids = fill(depth, expiring, rng)
+    started = time.perf_counter()
+    expired = queue.cleanup_expired()
+    cleanup_ms = (time.perf_counter() - started) * 1000
+
+    if {item['id'] for item in expired} != expired_ids:
+        errors.append(f'cleanup_expired returned {len(expired)} items, {len(expired_ids)} were expired')
+    if queue.get_health_status()['total_items'] != depth * len(ZoneType):
+        errors.append('total_items does not match the live items after cleanup')
+
+    started = time.perf_counter()
+    queue.cleanup_expired()
+    second_cleanup_us = (time.perf_counter() - started) * 1e6
+
+    # Без cleanup_expired: dequeue должен сам пропустить истёкшие элементы
+    queue, expired_ids = fill(depth, expiring, rng)
+    handed_out = 0
+    while (item := queue.dequeue()) is not None:
+        handed_out += item['id'] in expired_ids
+    if handed_out:
+        errors.append(f'dequeue handed out {handed_out} expired items')
+    health = queue.get_health_status()
+    if health['expired_items'] != len(expired_ids):
+        errors.append(f"expired_items is {health['expired_items']}, {len(expired_ids)} were skipped")
+    if len(queue.cleanup_expired()) != len(expired_ids):
+        errors.append('cleanup_expired did not return the items dequeue skipped')
+
+    return {
+        'depth_per_zone': depth,
+        'expired_per_zone': expiring,
+        'cleanup_ms': cleanup_ms,
+        'cleanup_nothing_expired_us': second_cleanup_us,
+        'errors': errors,
+    }
+
+
+def reaper_lag(tick, items):
+    queue = ThreadSafeZoneQueue(red_timeout=50, yellow_timeout=50, green_timeout=50)
+    lags = []
+    reaped = threading.Event()
+
+    def on_expired(expired):
+        now = time.time() * 1000
+        lags.extend(now - item['timestamp'] - 50 for item in expired)
+        if len(lags) >= items:
+            reaped.set()
+
+    queue.start_reaper(tick, on_expired)
+    for i in range(items):
+        queue.enqueue(make_item(i, time.time() * 1000), ZoneType.GREEN)
+    reaped.wait(10)
+    queue.stop_reaper()
+    lags.sort()
+    return {
+        'tick_sec': tick,
+        'items': items,
+        'reaped': len(lags),
+        'lag_p50_ms': lags[len(lags) // 2] if lags else None,
+        'lag_max_ms': lags[-1] if lags else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--depths', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--expiring', type=int, default=100, help='Expired items mixed into each zone')
+    parser.add_argument('--tick', type=float, default=0.05, help='Reaper interval, seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    report = {
+        'cleanup': [measure(depth, args.expiring, rng) for depth in args.depths],
+        'reaper': reaper_lag(args.tick, 100),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+    failed = any(result['errors'] for result in report['cleanup']) or report['reaper']['reaped'] < 100
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Memory per queued item of ZoneQueue in dict and compact storage modes.
+
+    python benchmarks/zone_queue_memory.py --items 200000
+
+Fills every zone of a ZoneQueue sized for `--items` items per zone and
+reports, for each mode, the bytes allocated per queued item (tracemalloc,
+including the item's own id string and data dict), the memory of the empty
+preallocated queue, the number of objects the garbage collector tracks per
+item, and the enqueue + dequeue throughput while full.
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from test10 import ZoneQueue, ZoneType
+
+NO_EXPIRY = {'red_timeout': 10 ** 9, 'yellow_timeout': 10 ** 9, 'green_timeout': 10 ** 9}
+
+
+def make_item(i):
+    return {'id': f'item-{i}', 'type': 'TRADE', 'data': {}, 'timestamp': time.time() * 1000}
+
+
+def measure(items, compact):
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    queue = ZoneQueue(max_zone_size={zone: items for zone in ZoneType}, compact=compact, **NO_EXPIRY)
+    empty = tracemalloc.get_traced_memory()[0] - baseline
+    objects = len(gc.get_objects())
+    for zone in ZoneType:
+        for i in range(items):
+            queue.enqueue(make_item(i), zone)
+    gc.collect()
+    full = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    tracked = len(gc.get_objects()) - objects
+
+    queued = items * len(ZoneType)
+    started = time.perf_counter()
+    for i in range(queued):
+        # dequeue берёт из RED, туда же и возвращаем, чтобы очередь оставалась полной
+        queue.dequeue()
+        queue.enqueue(make_item(i), ZoneType.RED)
+    elapsed = time.perf_counter() - started
+    return {
+        'mode': 'compact' if compact else 'dict',
+        'queued_items': queued,
+        'bytes_per_item': full / queued,
+        'empty_queue_bytes': empty,
+        'gc_objects_per_item': tracked / queued,
+        'dequeue_enqueue_per_sec': queued / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=200000, help='Items per zone')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    results = [measure(args.items, compact) for compact in (False, True)]
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Throughput of SharedZoneQueue as consumer processes are added.
+
+    python benchmarks/zone_queue_processes.py --items 50000 --workers 1 2 4 8 --work-us 50
+
+For every worker count, `--producers` processes push uniquely numbered items
+into random zones of one SharedZoneQueue while the workers drain it, each
+spending `--work-us` microseconds of CPU per item to stand for real
+processing. Reports items per second and the speedup over one worker; the
+speedup is bounded by the number of cores. Every item must be consumed
+exactly once and the health counters must end balanced; otherwise the script
+exits with status 1.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from test10 import QueueFullException, SharedZoneQueue, ZoneType
+
+NO_EXPIRY = {'red_timeout': 10 ** 9, 'yellow_timeout': 10 ** 9, 'green_timeout': 10 ** 9}
+ZONES = list(ZoneType)
+
+
+def produce(queue, first, last):
+    rng = random.Random(first)
+    for i in range(first, last):
+        item = {'id': str(i), 'type': 'TRADE', 'data': {'n': i}, 'timestamp': time.time() * 1000}
+        while True:
+            try:
+                queue.enqueue(item, rng.choice(ZONES))
+                break
+            except QueueFullException:
+                time.sleep(0.0005)
+
+
+def consume(queue, produced, work_us, results):
+    count = total = 0
+    while True:
+        item = queue.dequeue(timeout=0.05)
+        if item is None:
+            if produced.is_set() and queue.get_health_status()['total_items'] == 0:
+                break
+            continue
+        count += 1
+        total += int(item['id'])
+        spin_until = time.perf_counter() + work_us / 1e6
+        while time.perf_counter() < spin_until:
+            pass
+    results.put((count, total))
+
+
+def run(args, workers):
+    queue = SharedZoneQueue(max_zone_size={zone: args.zone_size for zone in ZoneType}, shards=args.shards,
+                            **NO_EXPIRY)
+    produced = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    try:
+        per_producer = args.items // args.producers
+        producers = [multiprocessing.Process(target=produce, args=(queue, p * per_producer, (p + 1) * per_producer))
+                     for p in range(args.producers)]
+        consumers = [multiprocessing.Process(target=consume, args=(queue, produced, args.work_us, results))
+                     for _ in range(workers)]
+        started = time.perf_counter()
+        for process in consumers + producers:
+            process.start()
+        for process in producers:
+            process.join()
+        produced.set()
+        outcomes = [results.get() for _ in consumers]
+        elapsed = time.perf_counter() - started
+        for process in consumers:
+            process.join()
+
+        items = per_producer * args.producers
+        consumed = sum(count for count, _ in outcomes)
+        health = queue.get_health_status()
+        errors = []
+        if consumed != items or sum(total for _, total in outcomes) != items * (items - 1) // 2:
+            errors.append(f'{consumed} items consumed out of {items}, or some more than once')
+        processed = sum(zone['items_processed'] for zone in health['zones'].values())
+        if health['total_items'] != 0 or processed != items:
+            errors.append(f"total_items is {health['total_items']}, items_processed is {processed}")
+        return {'workers': workers, 'items': items, 'items_per_sec': items / elapsed, 'errors': errors}
+    finally:
+        queue.close()
+        queue.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=50000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--producers', type=int, default=2)
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--zone-size', type=int, default=10000)
+    parser.add_argument('--work-us', type=float, default=50, help='CPU time spent per item by a worker')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    results = [run(args, workers) for workers in args.workers]
+    for result in results:
+        result['speedup'] = result['items_per_sec'] / results[0]['items_per_sec']
+    report = {'cpus': os.cpu_count(), 'work_us': args.work_us, 'results': results}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+    sys.exit(1 if any(result['errors'] for result in results) else 0)
+
+
+if __name__ == '__main__':
+    main()
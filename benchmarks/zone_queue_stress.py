@@ -0,0 +1,186 @@
+"""
+Stress check of the concurrent ZoneQueue variants.
+
+    python benchmarks/zone_queue_stress.py --producers 8 --consumers 8 --items 20000
+
+Many producers push uniquely numbered items into random zones while many
+consumers drain them: ThreadSafeZoneQueue with threads blocked in
+dequeue(timeout=...), AsyncZoneQueue with tasks awaiting dequeue(). Every
+item must come out exactly once and the health counters must end balanced;
+otherwise the script exits with status 1. Also reports the throughput and
+the CPU time consumers burn while they wait on an empty queue.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from test10 import AsyncZoneQueue, QueueFullException, ThreadSafeZoneQueue, ZoneType
+
+ZONES = list(ZoneType)
+# Проверяем конкурентность, а не истечение: за прогон ничего не должно истечь
+NO_EXPIRY = {'red_timeout': 10 ** 9, 'yellow_timeout': 10 ** 9, 'green_timeout': 10 ** 9}
+
+
+def make_item(producer, i):
+    return {'id': f'{producer}-{i}', 'type': 'TRADE', 'data': {}, 'timestamp': time.time() * 1000}
+
+
+def check(queue, produced, consumed):
+    ids = [item['id'] for item in consumed]
+    health = queue.get_health_status()
+    errors = []
+    if len(ids) != len(set(ids)):
+        errors.append(f'{len(ids) - len(set(ids))} duplicated items')
+    missing = produced - set(ids)
+    if missing:
+        errors.append(f'{len(missing)} lost items')
+    if health['total_items'] != 0:
+        errors.append(f"total_items is {health['total_items']} after draining")
+    processed = sum(zone['items_processed'] for zone in health['zones'].values())
+    if processed != len(ids):
+        errors.append(f'items_processed is {processed}, {len(ids)} items were consumed')
+    return errors
+
+
+def run_threads(args):
+    queue = ThreadSafeZoneQueue(**NO_EXPIRY)
+    per_producer = args.items // args.producers
+    consumed, consumed_lock = [], threading.Lock()
+    done = threading.Event()
+
+    def produce(producer):
+        rng = random.Random(producer)
+        for i in range(per_producer):
+            item = make_item(producer, i)
+            while True:
+                try:
+                    queue.enqueue(item, rng.choice(ZONES))
+                    break
+                except QueueFullException:
+                    time.sleep(0.0005)
+
+    def consume():
+        received = []
+        while True:
+            item = queue.dequeue(timeout=0.05)
+            if item is not None:
+                received.append(item)
+            elif done.is_set():
+                break
+        with consumed_lock:
+            consumed.extend(received)
+
+    consumers = [threading.Thread(target=consume) for _ in range(args.consumers)]
+    producers = [threading.Thread(target=produce, args=(p,)) for p in range(args.producers)]
+    started = time.perf_counter()
+    for thread in consumers + producers:
+        thread.start()
+    for thread in producers:
+        thread.join()
+    while queue.get_health_status()['total_items']:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in consumers:
+        thread.join()
+
+    # Потребители ждут пустую очередь: процессорное время не должно расти
+    idle_consumers = [threading.Thread(target=queue.dequeue, kwargs={'timeout': args.idle_seconds})
+                      for _ in range(args.consumers)]
+    cpu_started = time.process_time()
+    for thread in idle_consumers:
+        thread.start()
+    for thread in idle_consumers:
+        thread.join()
+    idle_cpu = time.process_time() - cpu_started
+
+    produced = {f'{p}-{i}' for p in range(args.producers) for i in range(per_producer)}
+    return queue, produced, consumed, elapsed, idle_cpu
+
+
+async def run_tasks(args):
+    queue = AsyncZoneQueue(**NO_EXPIRY)
+    per_producer = args.items // args.producers
+    consumed = []
+
+    async def produce(producer):
+        rng = random.Random(producer)
+        for i in range(per_producer):
+            item = make_item(producer, i)
+            while True:
+                try:
+                    queue.enqueue(item, rng.choice(ZONES))
+                    break
+                except QueueFullException:
+                    await asyncio.sleep(0)
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+
+    async def consume():
+        while True:
+            item = await queue.dequeue()
+            if item is None:
+                return
+            consumed.append(item)
+            if len(consumed) % 50 == 0:
+                await asyncio.sleep(0)
+
+    consumers = [asyncio.create_task(consume()) for _ in range(args.consumers)]
+    started = time.perf_counter()
+    await asyncio.gather(*(produce(p) for p in range(args.producers)))
+    while queue.health_status['total_items']:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+
+    cpu_started = time.process_time()
+    await asyncio.sleep(args.idle_seconds)
+    idle_cpu = time.process_time() - cpu_started
+    for task in consumers:
+        task.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
+
+    produced = {f'{p}-{i}' for p in range(args.producers) for i in range(per_producer)}
+    return queue, produced, consumed, elapsed, idle_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--producers', type=int, default=8)
+    parser.add_argument('--consumers', type=int, default=8)
+    parser.add_argument('--items', type=int, default=20000, help='Total items, split between producers')
+    parser.add_argument('--idle-seconds', type=float, default=1.0,
+                        help='How long consumers wait on an empty queue for the idle CPU measurement')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    results = []
+    failed = False
+    for name, outcome in (('threads', run_threads(args)), ('asyncio', asyncio.run(run_tasks(args)))):
+        queue, produced, consumed, elapsed, idle_cpu = outcome
+        errors = check(queue, produced, consumed)
+        failed = failed or bool(errors)
+        results.append({
+            'variant': name,
+            'items': len(produced),
+            'consumed': len(consumed),
+            'items_per_sec': len(consumed) / elapsed,
+            'idle_cpu_sec': idle_cpu,
+            'errors': errors,
+        })
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
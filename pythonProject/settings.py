@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
+import importlib.util
 import os
 import sys
 from pathlib import Path
@@ -44,14 +45,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'task1.metrics.TimingMiddleware',
+    'task1.querybudget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'task1.admission.AdmissionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
 ROOT_URLCONF = 'pythonProject.urls'
@@ -59,7 +62,7 @@ TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'task1.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATE_DIR, ],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -74,16 +77,82 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'pythonProject.wsgi.application'
+ASGI_APPLICATION = 'pythonProject.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+SQLITE_PATH = os.environ.get('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3'))
+
+# Режим журнала хранится в самом файле БД: его один раз включает миграция 0009,
+# а не каждое соединение. WAL позволяет читать параллельно с записью
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'wal')
+
+# Выполняются на каждом новом соединении и ничего не меняют в файле
+SQLITE_PRAGMAS = {
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'normal'),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # мс
+    'cache_size': -20000,  # КиБ
+    'temp_store': 'memory',
+}
+
+
+def sqlite_init_command(pragmas):
+    return ';'.join(f'PRAGMA {name}={value}' for name, value in pragmas.items())
+
+
+# Постоянные соединения только под WSGI (их включает pythonProject.wsgi). Под ASGI синхронный код
+# запроса выполняется в потоках sync_to_async, а соединения закрываются сигналом конца запроса,
+# поэтому с CONN_MAX_AGE=None они бы копились по потокам; там каждое соединение живёт один запрос
+CONN_MAX_AGE = None if os.environ.get('DJANGO_PERSISTENT_CONNECTIONS') == '1' else 0
+
+
 DATABASES = {
+    # Единственный писатель: BEGIN IMMEDIATE берёт блокировку записи сразу,
+    # поэтому конкурирующие транзакции ждут busy_timeout вместо "database is locked"
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'NAME': SQLITE_PATH,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': sqlite_init_command(SQLITE_PRAGMAS),
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Тестовая база — файл, а не shared-cache в памяти: там конкурирующие писатели получают
+        # "table is locked" вместо ожидания busy_timeout, и тесты многопоточных воркеров невозможны
+        'TEST': {'NAME': str(BASE_DIR / 'test_db.sqlite3')},
+    },
+    # Read-only connections for chat reads (see task1.routers)
+    'readonly': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{SQLITE_PATH}?mode=ro',
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': sqlite_init_command(SQLITE_PRAGMAS),
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['task1.routers.ReadWriteRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'answers': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'answers',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
 
 
@@ -123,6 +192,13 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = Path(os.environ.get('STATIC_ROOT', BASE_DIR / 'staticfiles'))
+
+# Build step of task1.staticfiles (collectstatic with settings_production):
+# unused selectors are stripped from STATIC_PURGE, judging by the STATIC_PURGE_CONTENT files
+STATIC_PURGE = ['bootstrap/css/bootstrap.min.css']
+STATIC_PURGE_CONTENT = [BASE_DIR / 'templates']
+STATIC_PURGE_SAFELIST = ['show', 'fade', 'collapsing', 'active', 'disabled']  # добавляются из JS Bootstrap
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -132,9 +208,64 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # STATICFILES_DIRS = [BASE_DIR / 'templates/src']
 
 
+# LLM backend (OpenAI-compatible API).
+# LLM_BASE_URL can point at the local fake server: python manage.py fake_llm_server
+
+# Ключ задаётся только через окружение; без него запросы к LLM падают с ImproperlyConfigured
+LLM_API_KEY = os.environ.get('LLM_API_KEY', '')
+LLM_BASE_URL = os.environ.get('LLM_BASE_URL', 'https://api.proxyapi.ru/openai/v1')
+LLM_MODEL = os.environ.get('LLM_MODEL', 'gpt-4o-mini')
+
+# Pooled keep-alive HTTP client shared by all requests of a process (task1.llm)
+LLM_POOL_SIZE = int(os.environ.get('LLM_POOL_SIZE', 20))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get('LLM_KEEPALIVE_EXPIRY', 60))
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 60))
+LLM_CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT', 5))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 2))
+
+# Answer cache (task1.answer_cache): in-process LRU + persistent tier in CACHES[LLM_CACHE_ALIAS]
+LLM_CACHE_SIZE = int(os.environ.get('LLM_CACHE_SIZE', 1024))
+LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 24 * 60 * 60))
+LLM_CACHE_ALIAS = 'answers'
+
+# Conversation history sent with each prompt (task1.context), in tokens; 0 disables history
+LLM_CONTEXT_TOKENS = int(os.environ.get('LLM_CONTEXT_TOKENS', 0))
+LLM_CONTEXT_CHUNK = 50  # сколько постов читается из БД за один раз
+
+# Off-request answer generation (task1.jobs, python manage.py run_llm_workers)
+LLM_WORKERS = int(os.environ.get('LLM_WORKERS', 4))
+LLM_JOB_MAX_ATTEMPTS = 3
+LLM_JOB_STALE_AFTER = 300  # секунды, после которых зависшая задача возвращается в очередь
+LLM_JOB_POLL_TIMEOUT = 25  # максимальное время ожидания long-poll запроса, секунды
+
+# Query budget of views without @query_budget (task1.querybudget, checked when DEBUG)
+QUERY_BUDGET_DEFAULT = 10
+
+# Admission control for views that call the LLM (task1.admission)
+ADMISSION_VIEWS = ('addpage', 'addpage_stream')
+ADMISSION_RATE = float(os.environ.get('ADMISSION_RATE', 0.2))  # запросов в секунду на клиента
+ADMISSION_BURST = int(os.environ.get('ADMISSION_BURST', 5))
+ADMISSION_MAX_LLM_CALLS = int(os.environ.get('ADMISSION_MAX_LLM_CALLS', 32))  # на все процессы
+ADMISSION_MAX_BACKLOG = int(os.environ.get('ADMISSION_MAX_BACKLOG', 100))  # задач pending + running
+ADMISSION_RETRY_AFTER = 5  # секунды, при перегрузке
+
+# Stream answers over SSE (addpage/stream) instead of the job queue; serve over ASGI when enabled
+CHAT_STREAMING = os.environ.get('CHAT_STREAMING') == '1'
+
+
+# Cold storage for old posts (task1.archive, python manage.py archive_posts)
+ARCHIVE_DIR = Path(os.environ.get('ARCHIVE_DIR', BASE_DIR / 'archive'))
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+
+
+# Участники чата (task1.identities), создаются при первом обращении
+CHAT_USERNAME = 'vladimir'
+BOT_USERNAME = 'bot'
+
+
 TESTING = "test" in sys.argv
 
-if not TESTING:
+if DEBUG and not TESTING and importlib.util.find_spec('debug_toolbar'):
     INSTALLED_APPS = [
         *INSTALLED_APPS,
         "debug_toolbar",
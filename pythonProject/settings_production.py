@@ -0,0 +1,34 @@
+"""
+Production settings: DJANGO_SETTINGS_MODULE=pythonProject.settings_production
+
+No debug tooling and a lean middleware stack, so workers boot fast and every
+request only pays for the middleware it needs.
+"""
+import os
+
+from .settings import *
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', '127.0.0.1').split(',')
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']
+
+# Fingerprinted, purged and gzipped assets; build them with python manage.py collectstatic
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'task1.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
+MIDDLEWARE = [
+    'task1.metrics.TimingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'task1.admission.AdmissionMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
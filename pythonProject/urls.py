@@ -14,14 +14,23 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
-from debug_toolbar.toolbar import debug_toolbar_urls
+from django.urls import path, include, re_path
 from django.conf import settings
 
+from task1 import staticfiles
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('task1.urls')),
-    path('__debug__/', include('debug_toolbar.urls'))
 ]
+
+if not settings.DEBUG:
+    # В DEBUG статику отдаёт runserver прямо из STATICFILES_DIRS
+    urlpatterns.append(re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), staticfiles.serve))
+
+if 'debug_toolbar' in settings.INSTALLED_APPS:
+    urlpatterns.append(path('__debug__/', include('debug_toolbar.urls')))
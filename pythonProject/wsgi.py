@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pythonProject.settings')
+# Каждый запрос обслуживает один поток воркера, поэтому соединения с БД можно держать открытыми
+os.environ.setdefault('DJANGO_PERSISTENT_CONNECTIONS', '1')
 
 application = get_wsgi_application()
@@ -1,4 +1,6 @@
 from django.contrib import admin
-from .models import Post
+from .models import Conversation, Job, Post
 
+admin.site.register(Conversation)
 admin.site.register(Post)
+admin.site.register(Job)
@@ -0,0 +1,127 @@
+"""
+Admission control for the views that call the LLM (settings.ADMISSION_VIEWS).
+
+Every POST to them takes a token from the client's bucket (ADMISSION_RATE
+tokens per second, up to ADMISSION_BURST). Buckets are rows of
+RateLimitBucket and are updated with a conditional UPDATE, so the limit holds
+across worker processes. Independently of the client, requests are shed while
+the server is overloaded: too many unanswered jobs, or (for a streamed answer) as
+many LLM calls in flight as ADMISSION_MAX_LLM_CALLS allows. Calls in flight are
+the running jobs plus the LlmCallSlot rows of streamed answers; both live in the
+database, so the cap holds across every web and worker process. A slot or a job
+is taken in an IMMEDIATE transaction together with the count, so two processes
+cannot both take the last one. Rejected requests get 429 with Retry-After right
+away instead of waiting in a queue.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Least
+from django.http import HttpResponse, JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from task1.models import Job, LlmCallSlot, RateLimitBucket
+
+
+def take(key: str, rate: float, burst: int, now: float = None) -> float:
+    """
+    Take one token from the bucket `key`. Returns 0 if it was taken, otherwise
+    the number of seconds until the bucket has a token again.
+    """
+    now = time.time() if now is None else now
+    available = Least(Value(float(burst)), F('tokens') + (Value(now) - F('updated_at')) * Value(rate),
+                      output_field=FloatField())
+    for _ in range(2):
+        taken = (RateLimitBucket.objects.filter(key=key).alias(available=available).filter(available__gte=1)
+                 .update(tokens=available - 1, updated_at=now))
+        if taken:
+            return 0
+
+        bucket = RateLimitBucket.objects.using('default').filter(key=key).first()
+        if bucket is not None:
+            tokens = min(burst, bucket.tokens + (now - bucket.updated_at) * rate)
+            return max(1 - tokens, 0) / rate
+
+        try:
+            with transaction.atomic(using='default'):
+                RateLimitBucket.objects.create(key=key, tokens=burst - 1, updated_at=now)
+        except IntegrityError:
+            continue  # бакет только что создал другой процесс
+        # Полные бакеты ничем не отличаются от отсутствующих
+        RateLimitBucket.objects.filter(updated_at__lt=now - burst / rate).delete()
+        return 0
+    return 1 / rate
+
+
+def llm_calls_in_flight(now: float = None) -> int:
+    """
+    Running jobs plus live slots. A slot older than LLM_JOB_STALE_AFTER belongs
+    to a process that died mid-stream and is not counted.
+    """
+    now = time.time() if now is None else now
+    slots = LlmCallSlot.objects.using('default').filter(acquired_at__gte=now - settings.LLM_JOB_STALE_AFTER)
+    return Job.objects.using('default').filter(status=Job.RUNNING).count() + slots.count()
+
+
+def acquire_llm_slot(now: float = None):
+    """
+    Take a slot for one LLM call and return its id, or None if the cap is reached.
+    """
+    now = time.time() if now is None else now
+    with transaction.atomic(using='default'):
+        if llm_calls_in_flight(now) >= settings.ADMISSION_MAX_LLM_CALLS:
+            return None
+        return LlmCallSlot.objects.using('default').create(acquired_at=now).pk
+
+
+def release_llm_slot(slot_id, now: float = None) -> None:
+    """
+    Free the slot, along with the stale slots of processes that died mid-stream.
+    """
+    now = time.time() if now is None else now
+    stale = Q(acquired_at__lt=now - settings.LLM_JOB_STALE_AFTER)
+    LlmCallSlot.objects.using('default').filter(Q(pk=slot_id) | stale).delete()
+
+
+def overloaded() -> float:
+    """
+    Seconds the client should wait if the server is overloaded, otherwise 0.
+    The LLM call cap itself is checked when a slot or a job is taken.
+    """
+    if Job.objects.filter(status__in=[Job.PENDING, Job.RUNNING]).count() >= settings.ADMISSION_MAX_BACKLOG:
+        return settings.ADMISSION_RETRY_AFTER
+    return 0
+
+
+def client_key(request) -> str:
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def too_many_requests(request, retry_after: float):
+    message = 'Too many requests, please try again later'
+    if 'application/json' in request.headers.get('Accept', ''):
+        response = JsonResponse({'error': message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class AdmissionMiddleware(MiddlewareMixin):
+    """
+    Place after AuthenticationMiddleware: authenticated users are limited per
+    account, anonymous clients per IP address.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method != 'POST' or request.resolver_match.url_name not in settings.ADMISSION_VIEWS:
+            return None
+        retry_after = overloaded() or take(client_key(request), settings.ADMISSION_RATE, settings.ADMISSION_BURST)
+        if retry_after:
+            return too_many_requests(request, retry_after)
+        return None
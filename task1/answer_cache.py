@@ -0,0 +1,96 @@
+"""
+Two-tier cache of LLM answers, in front of generate_answer.
+
+Tier 1 is an in-process LRU with a TTL; tier 2 is the Django cache configured
+as settings.LLM_CACHE_ALIAS (file based by default, so it is shared by all
+workers on the host and survives restarts). Keys are built from the normalized
+prompt, the model name and the system prompt.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> (expires_at, answer)
+_stats = {'hits': 0, 'persistent_hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+
+def normalize(text: str) -> str:
+    return ' '.join(text.split()).casefold()
+
+
+def make_key(prompt: str, model: str, system: str = '') -> str:
+    raw = json.dumps([normalize(prompt), model, ' '.join(system.split())], ensure_ascii=False)
+    return 'answer:' + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _persistent():
+    return caches[settings.LLM_CACHE_ALIAS]
+
+
+def _remember(key, answer):
+    _entries[key] = (time.monotonic() + settings.LLM_CACHE_TTL, answer)
+    _entries.move_to_end(key)
+    while len(_entries) > settings.LLM_CACHE_SIZE:
+        _entries.popitem(last=False)
+        _stats['evictions'] += 1
+
+
+def get(prompt: str, model: str, system: str = ''):
+    """
+    Return the cached answer or None.
+    """
+    key = make_key(prompt, model, system)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                _entries.move_to_end(key)
+                _stats['hits'] += 1
+                return entry[1]
+            del _entries[key]
+            _stats['expirations'] += 1
+
+    answer = _persistent().get(key)
+    with _lock:
+        if answer is None:
+            _stats['misses'] += 1
+        else:
+            _stats['persistent_hits'] += 1
+            _remember(key, answer)
+    return answer
+
+
+def set(prompt: str, model: str, system: str, answer: str) -> None:
+    key = make_key(prompt, model, system)
+    with _lock:
+        _remember(key, answer)
+    _persistent().set(key, answer, timeout=settings.LLM_CACHE_TTL)
+
+
+def invalidate(prompt: str, model: str, system: str = '') -> None:
+    key = make_key(prompt, model, system)
+    with _lock:
+        _entries.pop(key, None)
+        _stats['invalidations'] += 1
+    _persistent().delete(key)
+
+
+def clear() -> None:
+    """
+    Drop every cached answer from both tiers.
+    """
+    with _lock:
+        _entries.clear()
+        _stats['invalidations'] += 1
+    _persistent().clear()
+
+
+def stats() -> dict:
+    with _lock:
+        return {**_stats, 'size': len(_entries)}
@@ -0,0 +1,59 @@
+"""
+Bot answers: prompt construction and answer generation through the cache and the LLM gateway.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from task1 import answer_cache, llm
+
+SYSTEM_PROMPT = ''  # Тут нужно написать промт, выдающий роль помощника
+
+
+def build_messages(user_input, history=()):
+    return [
+        {"role": "system",
+         "content": SYSTEM_PROMPT},
+        *history,
+        {"role": "user",
+         "content": user_input}
+    ]
+
+
+def generate_answer(user_input, history=()):
+    """
+    Answer text for user_input; `history` is a list of earlier chat messages
+    (see task1.context). Only answers without history are cached, since the
+    cache key does not cover the conversation.
+    """
+    if history:
+        return llm.complete(build_messages(user_input, history))
+
+    answer = answer_cache.get(user_input, settings.LLM_MODEL, SYSTEM_PROMPT)
+    if answer is None:
+        answer = llm.complete(build_messages(user_input))
+        if answer:
+            answer_cache.set(user_input, settings.LLM_MODEL, SYSTEM_PROMPT, answer)
+    return answer
+
+
+async def stream_answer(user_input, history=()):
+    """
+    Tokens of the answer; a cached answer is sent as a single token. An empty
+    answer (the stream ended without content) is not cached.
+    """
+    if history:
+        async for token in llm.stream(build_messages(user_input, history)):
+            yield token
+        return
+
+    answer = await sync_to_async(answer_cache.get)(user_input, settings.LLM_MODEL, SYSTEM_PROMPT)
+    if answer is not None:
+        yield answer
+        return
+
+    parts = []
+    async for token in llm.stream(build_messages(user_input)):
+        parts.append(token)
+        yield token
+    if parts:
+        await sync_to_async(answer_cache.set)(user_input, settings.LLM_MODEL, SYSTEM_PROMPT, ''.join(parts))
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class Task1Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'task1'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from task1.metrics import install_db_timer
+
+        connection_created.connect(install_db_timer)
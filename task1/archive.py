@@ -0,0 +1,168 @@
+"""
+Cold storage for old chat history.
+
+archive_posts moves Posts older than settings.ARCHIVE_AFTER_DAYS out of the
+hot task1_post table into append-only SQLite segments, one file per month
+(posts-YYYY-MM.sqlite3) plus posts-undated.sqlite3 for posts without a date,
+with the text zlib-compressed. Posts are written to the segment first and
+deleted from the hot table afterwards; segment inserts ignore ids that are
+already there, so an interrupted run can simply be repeated.
+
+page_before reads the segments newest-first with the same (published_date, id)
+keyset as the hot history, so pagination falls through to the archive once the
+hot table is exhausted (see task1.pagination.history_page).
+"""
+import sqlite3
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from task1.models import Post
+
+UNDATED_SEGMENT = 'posts-undated.sqlite3'
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'  # UTC, сортируется как строка
+COLUMNS = 'id, conversation_id, author_id, author, published_date, text, token_count'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    conversation_id INTEGER,
+    author_id INTEGER NOT NULL,
+    author TEXT NOT NULL,
+    published_date TEXT,
+    text BLOB NOT NULL,
+    token_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS posts_conv_published_id_idx ON posts (conversation_id, published_date, id);
+'''
+
+
+@dataclass
+class ArchivedPost:
+    id: int
+    conversation_id: int
+    author_id: int
+    author: str
+    text: str
+    published_date: datetime
+    token_count: int
+
+
+def archive_dir() -> Path:
+    return Path(settings.ARCHIVE_DIR)
+
+
+def segment_name(published_date) -> str:
+    if published_date is None:
+        return UNDATED_SEGMENT
+    return f'posts-{published_date.astimezone(dt_timezone.utc):%Y-%m}.sqlite3'
+
+
+def segments() -> list:
+    """
+    Segment paths, newest month first; the undated segment is the oldest.
+    """
+    dated = sorted((path for path in archive_dir().glob('posts-*.sqlite3') if path.name != UNDATED_SEGMENT),
+                   reverse=True)
+    undated = archive_dir() / UNDATED_SEGMENT
+    return dated + ([undated] if undated.exists() else [])
+
+
+def _format_date(value):
+    return value.astimezone(dt_timezone.utc).strftime(DATE_FORMAT) if value else None
+
+
+def _parse_date(value):
+    return datetime.strptime(value, DATE_FORMAT).replace(tzinfo=dt_timezone.utc) if value else None
+
+
+def _write_segment(name, posts):
+    conn = sqlite3.connect(archive_dir() / name)
+    try:
+        conn.executescript(SCHEMA)
+        with conn:
+            conn.executemany(
+                f'INSERT OR IGNORE INTO posts ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(post.id, post.conversation_id, post.author_id, post.author.get_username(),
+                  _format_date(post.published_date), zlib.compress(post.text.encode()), post.token_count)
+                 for post in posts],
+            )
+    finally:
+        conn.close()
+
+
+def archive_posts(older_than_days: int = None, batch_size: int = 1000, stdout=None) -> int:
+    """
+    Move posts older than `older_than_days` (and all undated posts) to the
+    archive, oldest first. Returns the number of archived posts.
+    """
+    days = settings.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = timezone.now() - timedelta(days=days)
+    archive_dir().mkdir(parents=True, exist_ok=True)
+
+    old_posts = (Post.objects.using('default').select_related('author')
+                 .filter(Q(published_date__isnull=True) | Q(published_date__lt=cutoff)))
+    archived = 0
+    while True:
+        batch = list(old_posts.order_by('published_date', 'id')[:batch_size])
+        if not batch:
+            break
+
+        by_segment = {}
+        for post in batch:
+            by_segment.setdefault(segment_name(post.published_date), []).append(post)
+        for name, posts in by_segment.items():
+            _write_segment(name, posts)
+
+        with transaction.atomic(using='default'):
+            Post.objects.filter(id__in=[post.id for post in batch]).delete()
+
+        archived += len(batch)
+        if stdout is not None:
+            stdout.write(f'Archived {archived} posts (up to {batch[-1].published_date or "undated"})')
+    return archived
+
+
+def _read_segment(path, where, params, limit):
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = conn.execute(f'SELECT {COLUMNS} FROM posts WHERE {where} '
+                            f'ORDER BY published_date DESC, id DESC LIMIT ?', [*params, limit]).fetchall()
+    finally:
+        conn.close()
+    return [ArchivedPost(id, conversation_id, author_id, author, zlib.decompress(text).decode(), _parse_date(date),
+                         tokens)
+            for id, conversation_id, author_id, author, date, text, tokens in rows]
+
+
+def page_before(conversation, published=None, post_id=None, limit=50):
+    """
+    Up to `limit` archived posts of `conversation` older than (published,
+    post_id), newest first; with post_id None, the newest archived posts.
+    """
+    scope, scope_params = 'conversation_id IS ?', [conversation.pk if conversation is not None else None]
+    posts = []
+    for path in segments():
+        undated_segment = path.name == UNDATED_SEGMENT
+        if post_id is None or (published is not None and undated_segment):
+            where, params = scope, scope_params
+        elif published is None:
+            if not undated_segment:
+                continue  # курсор на посте без даты: все датированные посты новее
+            where, params = f'{scope} AND id < ?', [*scope_params, post_id]
+        else:
+            if path.name > segment_name(published):
+                continue  # сегмент целиком новее курсора
+            key = _format_date(published)
+            where = f'{scope} AND published_date <= ? AND (published_date < ? OR id < ?)'
+            params = [*scope_params, key, key, post_id]
+        posts += _read_segment(path, where, params, limit - len(posts))
+        if len(posts) >= limit:
+            break
+    return posts
@@ -0,0 +1,49 @@
+"""
+Conversation history for the LLM prompt, limited by a token budget.
+
+Posts of the prompt's conversation are read newest-first over
+post_conv_published_id_idx and reading stops as soon as the budget is spent,
+using the token counts stored on each Post, so building a prompt costs
+O(window) rather than O(history).
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from task1.identities import get_bot
+from task1.models import Post
+from task1.tokens import count_tokens
+
+
+def history_messages(before: Post, budget: int) -> list:
+    """
+    Chat messages for the turns preceding `before`, oldest first, whose total
+    token count fits into `budget`.
+    """
+    if budget <= 0 or before.published_date is None:
+        return []
+
+    older = Post.objects.filter(conversation=before.conversation_id, published_date__lte=before.published_date)
+    older = older.filter(Q(published_date__lt=before.published_date) | Q(id__lt=before.id))
+    bot_id = get_bot().id
+
+    messages = []
+    for post in older.order_by('-published_date', '-id').values_list('author_id', 'text', 'token_count').iterator(
+            chunk_size=settings.LLM_CONTEXT_CHUNK):
+        author_id, text, token_count = post
+        tokens = token_count if token_count is not None else count_tokens(text)
+        if tokens > budget:
+            break
+        budget -= tokens
+        messages.append({'role': 'assistant' if author_id == bot_id else 'user', 'content': text})
+
+    messages.reverse()
+    return messages
+
+
+def prompt_history(prompt: Post, system_prompt: str) -> list:
+    """
+    History for answering `prompt` within settings.LLM_CONTEXT_TOKENS, after
+    reserving room for the system prompt and the prompt itself.
+    """
+    budget = settings.LLM_CONTEXT_TOKENS - count_tokens(system_prompt) - count_tokens(prompt.text)
+    return history_messages(prompt, budget)
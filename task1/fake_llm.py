@@ -0,0 +1,125 @@
+"""
+Local fake of the OpenAI chat completions API, for offline development and benchmarks.
+
+Answers every prompt with an echo of the last user message, either as a single
+JSON completion or as an SSE stream of chunks (stream=true), with a configurable
+time to first token and token rate.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_answer(messages) -> str:
+    prompt = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+    return f'Echo: {prompt}'
+
+
+def split_tokens(text: str) -> list:
+    words = text.split(' ')
+    return [word if i == 0 else ' ' + word for i, word in enumerate(words)]
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    latency = 0.0  # секунды до первого токена
+    token_rate = 0.0  # токенов в секунду, 0 - без задержки
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        model = payload.get('model', 'fake')
+        tokens = split_tokens(make_answer(payload.get('messages', [])))
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if payload.get('stream'):
+            self._stream(completion_id, model, tokens)
+        else:
+            self._complete(completion_id, model, tokens)
+
+    def _pause(self):
+        if self.token_rate:
+            time.sleep(1 / self.token_rate)
+
+    def _complete(self, completion_id, model, tokens):
+        for _ in tokens:
+            self._pause()
+        body = json.dumps({
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                'finish_reason': 'stop',
+            }],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': len(tokens), 'total_tokens': len(tokens)},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, completion_id, model, tokens):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def chunk(delta, finish_reason=None):
+            return {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+
+        events = [chunk({'role': 'assistant', 'content': ''})]
+        events += [chunk({'content': token}) for token in tokens]
+        events.append(chunk({}, 'stop'))
+
+        for i, event in enumerate(events):
+            if 0 < i < len(events) - 1:
+                self._pause()
+            self._write_chunk(f'data: {json.dumps(event)}\n\n'.encode())
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+
+def make_server(host='127.0.0.1', port=8001, latency=0.0, token_rate=0.0) -> ThreadingHTTPServer:
+    handler = type('ConfiguredFakeLLMHandler', (FakeLLMHandler,),
+                   {'latency': latency, 'token_rate': token_rate})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(**kwargs) -> ThreadingHTTPServer:
+    """
+    Start the fake server in a daemon thread; its base URL for LLM_BASE_URL is
+    f'http://{host}:{port}/v1' with host, port = server.server_address.
+    """
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
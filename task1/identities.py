@@ -0,0 +1,60 @@
+"""
+Chat participants (the human user and the bot), resolved on first use and then
+cached for the life of the process, so importing views never touches the DB.
+
+Requests are served in a conversation: an authenticated user gets their own,
+anonymous visitors share the conversation of settings.CHAT_USERNAME.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from task1.models import Conversation
+
+
+def _get_user(username):
+    user, _ = get_user_model().objects.get_or_create(username=username)
+    return user
+
+
+def _get_conversation(owner):
+    conversation, _ = Conversation.objects.get_or_create(owner=owner)
+    return conversation
+
+
+@lru_cache(maxsize=None)
+def get_me():
+    return _get_user(settings.CHAT_USERNAME)
+
+
+@lru_cache(maxsize=None)
+def get_bot():
+    return _get_user(settings.BOT_USERNAME)
+
+
+@lru_cache(maxsize=None)
+def default_conversation():
+    return _get_conversation(get_me())
+
+
+def current_author(request):
+    return request.user if request.user.is_authenticated else get_me()
+
+
+def current_conversation(request):
+    """
+    Conversation of the request's user, resolved once per request.
+    """
+    if not hasattr(request, '_conversation'):
+        if request.user.is_authenticated:
+            request._conversation = _get_conversation(request.user)
+        else:
+            request._conversation = default_conversation()
+    return request._conversation
+
+
+def reset():
+    get_me.cache_clear()
+    get_bot.cache_clear()
+    default_conversation.cache_clear()
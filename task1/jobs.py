@@ -0,0 +1,115 @@
+"""
+Off-request answer generation.
+
+addpage stores the user Post and enqueues a Job; a pool of worker threads
+(python manage.py run_llm_workers) claims pending jobs from the Job table,
+runs generate_answer and stores the bot Post. The table lives in the project
+database, so queued jobs survive restarts and several worker processes can
+share it: a job is claimed with a conditional UPDATE, which only one worker
+can win. A running job is an LLM call in flight, so jobs are only claimed while
+the calls in flight are below ADMISSION_MAX_LLM_CALLS (see task1.admission).
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from task1.admission import llm_calls_in_flight
+from task1.answers import SYSTEM_PROMPT, generate_answer
+from task1.context import prompt_history
+from task1.identities import get_bot
+from task1.models import Job, Post
+
+logger = logging.getLogger(__name__)
+
+STALE_CHECK_INTERVAL = 30  # как часто супервизор ищет зависшие задачи, секунды
+
+
+def enqueue(post) -> Job:
+    return Job.objects.create(prompt=post)
+
+
+def claim_next():
+    """
+    Mark the oldest pending job as running and return it, or None if the queue
+    is empty or the LLM call cap is reached.
+    """
+    while True:
+        # Счётчик и захват в одной IMMEDIATE-транзакции, иначе два воркера займут последний слот
+        with transaction.atomic(using='default'):
+            if llm_calls_in_flight() >= settings.ADMISSION_MAX_LLM_CALLS:
+                return None
+            job = Job.objects.using('default').filter(status=Job.PENDING).order_by('id').first()
+            if job is None:
+                return None
+            claimed = Job.objects.filter(pk=job.pk, status=Job.PENDING).update(
+                status=Job.RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1)
+        if claimed:
+            return Job.objects.select_related('prompt').using('default').get(pk=job.pk)
+        # Задачу забрал другой воркер, пробуем следующую
+
+
+def run(job) -> None:
+    try:
+        answer = generate_answer(job.prompt.text, prompt_history(job.prompt, SYSTEM_PROMPT))
+    except Exception as exc:
+        logger.exception('Job %s failed', job.pk)
+        status = Job.FAILED if job.attempts >= settings.LLM_JOB_MAX_ATTEMPTS else Job.PENDING
+        Job.objects.filter(pk=job.pk).update(status=status, error=str(exc), finished_at=timezone.now())
+        return
+
+    bot_post = Post.objects.create(author=get_bot(), conversation_id=job.prompt.conversation_id, text=answer,
+                                   published_date=timezone.now())
+    Job.objects.filter(pk=job.pk).update(status=Job.DONE, answer=bot_post, error='', finished_at=timezone.now())
+
+
+def requeue_stale() -> int:
+    """
+    Return jobs left running by a worker that died to the queue.
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.LLM_JOB_STALE_AFTER)
+    return Job.objects.filter(status=Job.RUNNING, started_at__lt=stale_before).update(status=Job.PENDING)
+
+
+def work(stop: threading.Event, poll_interval: float) -> None:
+    while not stop.is_set():
+        close_old_connections()
+        job = claim_next()
+        if job is None:
+            stop.wait(poll_interval)
+            continue
+        run(job)
+
+
+def run_workers(concurrency: int, poll_interval: float, stop: threading.Event = None) -> None:
+    """
+    Process jobs with `concurrency` threads until `stop` is set (or forever).
+    Stale jobs are requeued at startup and then every STALE_CHECK_INTERVAL
+    seconds, so jobs of another worker process that died are picked up while
+    this one keeps running.
+    """
+    stop = stop or threading.Event()
+    requeue_stale()
+    last_check = time.monotonic()
+    threads = [threading.Thread(target=work, args=(stop, poll_interval), name=f'llm-worker-{i}', daemon=True)
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(0.5)
+            if time.monotonic() - last_check >= STALE_CHECK_INTERVAL:
+                close_old_connections()
+                requeued = requeue_stale()
+                if requeued:
+                    logger.warning('Requeued %s stale jobs', requeued)
+                last_check = time.monotonic()
+    except KeyboardInterrupt:
+        stop.set()
+    for thread in threads:
+        thread.join()
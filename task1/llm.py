@@ -0,0 +1,144 @@
+"""
+Process-wide gateway to the LLM backend.
+
+All chat completions go through here: the OpenAI clients are created once per
+process on top of a pooled keep-alive HTTP client, so messages reuse open
+connections instead of paying for a new TLS handshake each time. Identical
+requests that are in flight at the same moment are coalesced into one upstream
+call whose result is shared by every caller.
+"""
+import asyncio
+import json
+import threading
+import weakref
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from task1 import metrics
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncOpenAI
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _http_options():
+    import httpx
+
+    return {
+        'limits': httpx.Limits(max_connections=settings.LLM_POOL_SIZE,
+                               max_keepalive_connections=settings.LLM_POOL_SIZE,
+                               keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY),
+        'timeout': httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+    }
+
+
+def _api_key():
+    if not settings.LLM_API_KEY:
+        raise ImproperlyConfigured('LLM_API_KEY is not set: export it before starting the server or the workers')
+    return settings.LLM_API_KEY
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # SDK импортируется при первом запросе, а не при старте воркера
+                import httpx
+                from openai import OpenAI
+
+                options = _http_options()
+                _client = OpenAI(
+                    api_key=_api_key(),
+                    base_url=settings.LLM_BASE_URL,
+                    max_retries=settings.LLM_MAX_RETRIES,
+                    timeout=options['timeout'],
+                    http_client=httpx.Client(**options),
+                )
+    return _client
+
+
+def get_async_client():
+    """
+    Async connections are bound to the event loop that opened them, so there is
+    one pooled client per running loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        import httpx
+        from openai import AsyncOpenAI
+
+        options = _http_options()
+        client = AsyncOpenAI(
+            api_key=_api_key(),
+            base_url=settings.LLM_BASE_URL,
+            max_retries=settings.LLM_MAX_RETRIES,
+            timeout=options['timeout'],
+            http_client=httpx.AsyncClient(**options),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def reset():
+    """
+    Drop the pooled clients, e.g. after changing LLM settings or forking a worker.
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+    _async_clients.clear()
+
+
+def complete(messages, model=None) -> str:
+    """
+    Return the answer text for a chat completion request.
+
+    Concurrent calls with the same model and messages wait for a single
+    upstream request; errors are propagated to every waiting caller.
+    """
+    model = model or settings.LLM_MODEL
+    key = json.dumps([model, messages], sort_keys=True, ensure_ascii=False)
+
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+
+    if not leader:
+        return future.result()
+
+    try:
+        with metrics.timed('llm', histogram='chat_llm_seconds'):
+            completion = get_client().chat.completions.create(model=model, messages=messages)
+        future.set_result(completion.choices[0].message.content or '')
+    except BaseException as exc:
+        future.set_exception(exc)
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+    return future.result()
+
+
+async def stream(messages, model=None):
+    """
+    Async generator of answer tokens as they arrive from the LLM.
+    """
+    with metrics.timed('llm', histogram='chat_llm_first_token_seconds'):
+        response = await get_async_client().chat.completions.create(
+            model=model or settings.LLM_MODEL,
+            messages=messages,
+            stream=True,
+        )
+    async for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
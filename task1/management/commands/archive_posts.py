@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from task1.archive import archive_posts
+
+
+class Command(BaseCommand):
+    help = 'Move old posts from the database to the compressed read-only archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help='Keep archiving every --interval seconds')
+        parser.add_argument('--interval', type=float, default=3600)
+
+    def handle(self, *args, **options):
+        while True:
+            archived = archive_posts(options['older_than_days'], options['batch_size'], stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f'Archived {archived} posts'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from task1.fake_llm import make_server
+
+
+class Command(BaseCommand):
+    help = 'Run a local fake OpenAI-compatible chat completions server (supports stream=true)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Seconds before the first token is sent')
+        parser.add_argument('--token-rate', type=float, default=0.0,
+                            help='Tokens per second, 0 for no delay')
+
+    def handle(self, *args, **options):
+        server = make_server(options['host'], options['port'], options['latency'], options['token_rate'])
+        host, port = server.server_address
+        self.stdout.write(f'Fake LLM listening, set LLM_BASE_URL=http://{host}:{port}/v1 and any LLM_API_KEY')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
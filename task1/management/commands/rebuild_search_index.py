@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from task1.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from the posts table'
+
+    def handle(self, *args, **options):
+        indexed = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Search index is up to date: {indexed} posts'))
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from task1.models import Conversation
+from task1.replay import replay
+
+
+class Command(BaseCommand):
+    help = 'Answer every prompt of a JSONL file and store the user/bot posts, resumably'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL file: one JSON object (or string) per line')
+        parser.add_argument('--field', default='prompt', help='Key of the prompt in each JSON object')
+        parser.add_argument('--concurrency', type=int, default=settings.LLM_WORKERS,
+                            help='Number of prompts answered in parallel')
+        parser.add_argument('--batch-size', type=int, default=100, help='Post pairs stored per transaction')
+        parser.add_argument('--retries', type=int, default=3, help='Retries per prompt on top of the client retries')
+        parser.add_argument('--backoff', type=float, default=1.0, help='First retry delay, seconds; doubles each retry')
+        parser.add_argument('--no-cache', action='store_true', help='Regenerate answers instead of reusing cached ones')
+        parser.add_argument('--checkpoint', help='Checkpoint name (default: the absolute path of the file)')
+        parser.add_argument('--conversation', type=int, help='Conversation id (default: the anonymous chat)')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Answer again only the prompts that failed in earlier runs')
+
+    def handle(self, *args, **options):
+        conversation = None
+        if options['conversation'] is not None:
+            try:
+                conversation = Conversation.objects.select_related('owner').get(pk=options['conversation'])
+            except Conversation.DoesNotExist:
+                raise CommandError(f"Conversation {options['conversation']} does not exist")
+        counters = replay(options['path'], field=options['field'], concurrency=options['concurrency'],
+                          batch_size=options['batch_size'], retries=options['retries'], backoff=options['backoff'],
+                          use_cache=not options['no_cache'], checkpoint=options['checkpoint'],
+                          conversation=conversation, retry_failed=options['retry_failed'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Stored {counters['stored']} pairs, {counters['failed']} failed"))
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from task1.jobs import run_workers
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of worker threads that answer queued chat messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.LLM_WORKERS,
+                            help='Number of jobs processed in parallel')
+        parser.add_argument('--poll-interval', type=float, default=0.5,
+                            help='Seconds to wait before checking an empty queue again')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Starting {options['concurrency']} LLM workers")
+        run_workers(options['concurrency'], options['poll_interval'])
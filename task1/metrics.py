@@ -0,0 +1,204 @@
+"""
+Lightweight request instrumentation.
+
+TimingMiddleware times every request and its phases (DB queries, template
+rendering, LLM calls), adds a Server-Timing header and aggregates the timings
+into fixed-bucket histograms, exposed in the Prometheus text format by the
+/metrics view. Phases are collected through a context variable, so timings
+from sync_to_async threads are attributed to the right request. Histograms
+are per process; Prometheus sums them across workers.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.template.backends.django import DjangoTemplates
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PHASES = ('db', 'template', 'llm')
+
+_phases = ContextVar('request_phases', default=None)
+
+
+class Histogram:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(BUCKETS, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (name, labels) -> Histogram
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        return histogram
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            items = sorted(self.histograms.items())
+        seen = set()
+        for (name, labels), histogram in items:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# TYPE {name} histogram')
+            counts, total = histogram.snapshot()
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{_labels(labels, le=le)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+
+registry = Registry()
+
+
+def record(phase: str, seconds: float) -> None:
+    phases = _phases.get()
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+        phases[phase + '_count'] = phases.get(phase + '_count', 0) + 1
+
+
+def query_count() -> int:
+    """
+    SQL queries run so far by the current request (0 outside TimingMiddleware).
+    """
+    phases = _phases.get()
+    return phases.get('db_count', 0) if phases is not None else 0
+
+
+@contextmanager
+def timed(phase: str, histogram: str = None):
+    """
+    Time the block as `phase` of the current request; with `histogram`, also
+    observe it there, which covers work done outside requests (LLM workers).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        record(phase, elapsed)
+        if histogram:
+            registry.histogram(histogram).observe(elapsed)
+
+
+def db_timer(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record('db', time.perf_counter() - started)
+
+
+def install_db_timer(sender, connection, **kwargs):
+    """
+    connection_created receiver: time every query of the new connection.
+    """
+    if db_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_timer)
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return self.template.render(context, request)
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend that reports rendering time to the current request.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class TimingMiddleware:
+    """
+    Times the request and its phases, emits Server-Timing and updates the
+    chat_request_seconds / chat_request_phase_seconds histograms.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        phases = {}
+        token = _phases.set(phases)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _phases.reset(token)
+        return self.finish(request, response, phases, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        phases = {}
+        token = _phases.set(phases)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _phases.reset(token)
+        return self.finish(request, response, phases, time.perf_counter() - started)
+
+    def finish(self, request, response, phases, total):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+
+        timings = []
+        for phase in PHASES:
+            if phase in phases:
+                registry.histogram('chat_request_phase_seconds', view=view, phase=phase).observe(phases[phase])
+                timings.append(f'{phase};dur={phases[phase] * 1000:.1f};desc="{phases[phase + "_count"]}"')
+        registry.histogram('chat_request_seconds', view=view).observe(total)
+        timings.append(f'total;dur={total * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(timings)
+        return response
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:33
+
+from django.db import migrations, models
+
+from task1.tokens import count_tokens
+
+
+def count_existing_tokens(apps, schema_editor):
+    # Явно через соединение миграции: роутер отправил бы чтение на 'readonly'
+    db = schema_editor.connection.alias
+    Post = apps.get_model('task1', 'Post')
+    batch = []
+    for post in Post.objects.using(db).only('id', 'text').iterator(chunk_size=1000):
+        post.token_count = count_tokens(post.text)
+        batch.append(post)
+        if len(batch) == 1000:
+            Post.objects.using(db).bulk_update(batch, ['token_count'])
+            batch = []
+    Post.objects.using(db).bulk_update(batch, ['token_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task1', '0003_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='token_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(count_existing_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Полнотекстовый индекс по Post.text. Таблица FTS5 хранит свою копию текста с rowid = id поста
+# и поддерживается триггерами; существующие посты индексирует manage.py rebuild_search_index.
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE task1_post_fts USING fts5(text, tokenize='unicode61 remove_diacritics 2')",
+    """
+    CREATE TRIGGER task1_post_fts_insert AFTER INSERT ON task1_post BEGIN
+        INSERT INTO task1_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER task1_post_fts_delete AFTER DELETE ON task1_post BEGIN
+        DELETE FROM task1_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER task1_post_fts_update AFTER UPDATE OF text ON task1_post BEGIN
+        DELETE FROM task1_post_fts WHERE rowid = old.id;
+        INSERT INTO task1_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS task1_post_fts_update',
+    'DROP TRIGGER IF EXISTS task1_post_fts_delete',
+    'DROP TRIGGER IF EXISTS task1_post_fts_insert',
+    'DROP TABLE IF EXISTS task1_post_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task1', '0004_post_token_count'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, DROP_SQL),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task1', '0005_post_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['updated_at'], name='ratelimit_updated_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_conversations(apps, schema_editor):
+    # Вся существующая переписка — один разговор владельца чата
+    db = schema_editor.connection.alias
+    Post = apps.get_model('task1', 'Post')
+    if not Post.objects.using(db).filter(conversation__isnull=True).exists():
+        return
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Conversation = apps.get_model('task1', 'Conversation')
+    owner, _ = User.objects.using(db).get_or_create(username=settings.CHAT_USERNAME)
+    conversation = Conversation.objects.using(db).create(owner=owner)
+    Post.objects.using(db).filter(conversation__isnull=True).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task1', '0006_ratelimitbucket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='posts', to='task1.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['conversation', 'published_date', 'id'], name='post_conv_published_id_idx'),
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task1', '0007_conversation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplayCheckpoint',
+            fields=[
+                ('name', models.CharField(max_length=1024, primary_key=True, serialize=False)),
+                ('next_line', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
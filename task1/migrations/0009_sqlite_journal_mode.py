@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def set_journal_mode(apps, schema_editor):
+    # Режим журнала сохраняется в файле БД, так что достаточно включить его один раз
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}')
+
+
+class Migration(migrations.Migration):
+    # journal_mode нельзя сменить внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('task1', '0008_replaycheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_journal_mode, migrations.RunPython.noop),
+    ]
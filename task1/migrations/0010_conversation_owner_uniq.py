@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_conversations(apps, schema_editor):
+    # Дубликаты появлялись при параллельных первых запросах: посты переносим в самый старый разговор
+    db = schema_editor.connection.alias
+    Conversation = apps.get_model('task1', 'Conversation')
+    Post = apps.get_model('task1', 'Post')
+    duplicated = (Conversation.objects.using(db).values('owner').annotate(count=Count('id'), first=Min('id'))
+                  .filter(count__gt=1))
+    for row in duplicated:
+        extra = Conversation.objects.using(db).filter(owner=row['owner']).exclude(pk=row['first'])
+        Post.objects.using(db).filter(conversation__in=extra).update(conversation=row['first'])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task1', '0009_sqlite_journal_mode'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_conversations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('owner',), name='conversation_owner_uniq'),
+        ),
+    ]
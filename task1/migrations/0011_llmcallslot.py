@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task1', '0010_conversation_owner_uniq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LlmCallSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('acquired_at', models.FloatField(db_index=True)),
+            ],
+        ),
+    ]
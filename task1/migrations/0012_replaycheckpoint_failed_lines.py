@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task1', '0011_llmcallslot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='replaycheckpoint',
+            name='failed_lines',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations
+
+# Индекс FTS5 становится external-content таблицей: текст хранится только в task1_post, индекс
+# ссылается на него по id, а snippet() читает текст оттуда же. Триггеры передают индексу старый
+# текст удаляемой строки командой 'delete', иначе FTS5 не сможет убрать её токены.
+#
+# Внимание: триггеры висят на task1_post. Если будущая миграция пересоздаст эту таблицу (SQLite
+# делает так для большинства AlterField/RemoveField), триггеры молча пропадут вместе со старой
+# таблицей, и индекс перестанет обновляться. Такая миграция должна заново выполнить CREATE_TRIGGERS,
+# после чего индекс нужно перестроить: python manage.py rebuild_search_index.
+CREATE_TRIGGERS = [
+    """
+    CREATE TRIGGER task1_post_fts_insert AFTER INSERT ON task1_post BEGIN
+        INSERT INTO task1_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER task1_post_fts_delete AFTER DELETE ON task1_post BEGIN
+        INSERT INTO task1_post_fts(task1_post_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER task1_post_fts_update AFTER UPDATE OF text ON task1_post BEGIN
+        INSERT INTO task1_post_fts(task1_post_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO task1_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS task1_post_fts_update',
+    'DROP TRIGGER IF EXISTS task1_post_fts_delete',
+    'DROP TRIGGER IF EXISTS task1_post_fts_insert',
+    'DROP TABLE IF EXISTS task1_post_fts',
+]
+
+CREATE_SQL = [
+    *DROP_SQL,
+    "CREATE VIRTUAL TABLE task1_post_fts USING fts5(text, content='task1_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    *CREATE_TRIGGERS,
+    "INSERT INTO task1_post_fts(task1_post_fts) VALUES ('rebuild')",
+]
+
+# Прежняя схема из 0005_post_fts: таблица с собственной копией текста
+REVERSE_SQL = [
+    *DROP_SQL,
+    "CREATE VIRTUAL TABLE task1_post_fts USING fts5(text, tokenize='unicode61 remove_diacritics 2')",
+    """
+    CREATE TRIGGER task1_post_fts_insert AFTER INSERT ON task1_post BEGIN
+        INSERT INTO task1_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER task1_post_fts_delete AFTER DELETE ON task1_post BEGIN
+        DELETE FROM task1_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER task1_post_fts_update AFTER UPDATE OF text ON task1_post BEGIN
+        DELETE FROM task1_post_fts WHERE rowid = old.id;
+        INSERT INTO task1_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    'INSERT INTO task1_post_fts(rowid, text) SELECT id, text FROM task1_post',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task1', '0012_replaycheckpoint_failed_lines'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, REVERSE_SQL),
+    ]
@@ -2,11 +2,50 @@ from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
+from task1.tokens import count_tokens
+
+
+class Conversation(models.Model):
+    """
+    One chat between a user and the bot; every Post belongs to one.
+    """
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversations')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            # Один разговор на пользователя: параллельные первые запросы не создают дубликатов
+            models.UniqueConstraint(fields=['owner'], name='conversation_owner_uniq'),
+        ]
+
+    def __str__(self):
+        return f'Conversation {self.pk} ({self.owner})'
+
 
 class Post(models.Model):
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Поле nullable, чтобы SQLite добавил колонку без пересоздания таблицы (и FTS-триггеров)
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, null=True, blank=True,
+                                     related_name='posts')
     text = models.CharField(max_length=200, help_text='Enter your text here')
     published_date = models.DateTimeField(blank=True, null=True)
+    # Считается при записи, чтобы сборка контекста для LLM не токенизировала историю заново
+    token_count = models.PositiveIntegerField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Ключ курсорной пагинации истории: (published_date, id)
+            models.Index(fields=['published_date', 'id'], name='post_published_id_idx'),
+            # История одного разговора читается без просмотра чужих постов
+            models.Index(fields=['conversation', 'published_date', 'id'], name='post_conv_published_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.token_count = count_tokens(self.text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'token_count'}
+        super().save(*args, **kwargs)
 
     def publish(self):
         self.published_date = timezone.now()
@@ -14,3 +53,82 @@ class Post(models.Model):
 
     def __str__(self):
         return self.text
+
+
+class Job(models.Model):
+    """
+    Answer generation request for a user Post, processed off-request by
+    the LLM workers (python manage.py run_llm_workers).
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    prompt = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='jobs')
+    answer = models.ForeignKey(Post, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Воркеры выбирают самую старую задачу в статусе pending
+            models.Index(fields=['status', 'id'], name='job_status_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'Job {self.pk} ({self.status})'
+
+
+class RateLimitBucket(models.Model):
+    """
+    Token bucket of one client for task1.admission, kept in the database so
+    every worker process shares the same limits.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    tokens = models.FloatField()
+    updated_at = models.FloatField()  # time.time() последнего пополнения
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='ratelimit_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.key}: {self.tokens:.2f}'
+
+
+class LlmCallSlot(models.Model):
+    """
+    One LLM call in flight outside the job queue (a streamed answer). Together
+    with the running jobs the rows count against ADMISSION_MAX_LLM_CALLS in
+    every process; task1.admission takes and frees them.
+    """
+    acquired_at = models.FloatField(db_index=True)  # time.time() захвата
+
+    def __str__(self):
+        return f'LLM call slot {self.pk}'
+
+
+class ReplayCheckpoint(models.Model):
+    """
+    Next line to read of a replay_prompts run and the lines of prompts that
+    failed. Saved in the transaction that stores the batch of posts, so a
+    resumed run never stores a batch twice.
+    """
+    name = models.CharField(max_length=1024, primary_key=True)
+    next_line = models.PositiveBigIntegerField(default=0)
+    failed_lines = models.JSONField(default=list, blank=True)  # 0-based, по возрастанию
+
+    def __str__(self):
+        return f'{self.name}: line {self.next_line}'
@@ -0,0 +1,99 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+from task1 import archive
+
+PAGE_SIZE = 50
+ARCHIVE_CURSOR_PREFIX = 'a.'
+
+
+def encode_cursor(post) -> str:
+    """
+    Opaque cursor pointing at the oldest post of a page:
+    urlsafe base64 of "<published_date ISO or empty>|<id>".
+    """
+    published = post.published_date.isoformat() if post.published_date else ''
+    raw = f'{published}|{post.id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """
+    Returns (published_date or None, id). Raises ValueError on a malformed cursor.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        published, post_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return (datetime.fromisoformat(published) if published else None), int(post_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+
+def page_before(queryset, cursor: str = None, limit: int = PAGE_SIZE):
+    """
+    Keyset pagination over (published_date, id), newest first.
+
+    Returns (posts, next_cursor): posts are in chronological order, ready to be
+    rendered; next_cursor is None when there is no older history.
+    Each page is a single range scan over post_published_id_idx, so the cost does
+    not depend on how deep into the history the client has scrolled.
+    """
+    published, post_id = decode_cursor(cursor) if cursor else (None, None)
+
+    if cursor is None or published is not None:
+        page = queryset.filter(published_date__isnull=False)
+        if published is not None:
+            page = page.filter(published_date__lte=published).filter(
+                Q(published_date__lt=published) | Q(id__lt=post_id))
+        posts = list(page.order_by('-published_date', '-id')[:limit + 1])
+    else:
+        posts = []
+
+    # Посты без даты (старые записи) сортируются как самые ранние
+    if len(posts) <= limit:
+        undated = queryset.filter(published_date__isnull=True)
+        if published is None and post_id is not None:
+            undated = undated.filter(id__lt=post_id)
+        posts += list(undated.order_by('-id')[:limit + 1 - len(posts)])
+
+    next_cursor = encode_cursor(posts[limit - 1]) if len(posts) > limit else None
+    posts = posts[:limit]
+    posts.reverse()
+    return posts, next_cursor
+
+
+def history_page(queryset, cursor: str = None, limit: int = PAGE_SIZE, conversation=None, read_archive=True):
+    """
+    page_before that continues into the archive (task1.archive) of
+    `conversation` once the hot table runs out. Cursors into the archive carry
+    the ARCHIVE_CURSOR_PREFIX; a bare prefix means the newest archived posts.
+
+    With read_archive=False (the first render of the chat page) the page ends
+    with the hot posts and the archive is only probed for one older post: the
+    cursor points into the archive if there is one, otherwise it is None. The
+    archived page itself is read when the client scrolls up to it.
+    """
+    if cursor and cursor.startswith(ARCHIVE_CURSOR_PREFIX):
+        archive_cursor = cursor[len(ARCHIVE_CURSOR_PREFIX):]
+        published, post_id = decode_cursor(archive_cursor) if archive_cursor else (None, None)
+        posts = []
+    else:
+        posts, next_cursor = page_before(queryset, cursor, limit)
+        if next_cursor is not None:
+            return posts, next_cursor
+        if posts:
+            published, post_id = posts[0].published_date, posts[0].id
+        else:
+            published, post_id = decode_cursor(cursor) if cursor else (None, None)
+        if not read_archive:
+            if not archive.page_before(conversation, published, post_id, 1):
+                return posts, None
+            return posts, ARCHIVE_CURSOR_PREFIX + (encode_cursor(posts[0]) if posts else '')
+
+    wanted = limit - len(posts)
+    archived = archive.page_before(conversation, published, post_id, wanted + 1)
+    page = archived[:wanted][::-1] + posts
+    next_cursor = ARCHIVE_CURSOR_PREFIX + encode_cursor(page[0]) if len(archived) > wanted and page else None
+    return page, next_cursor
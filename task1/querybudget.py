@@ -0,0 +1,90 @@
+"""
+Query budgets: how many SQL queries a view may run.
+
+Views declare their budget with @query_budget(n). In development
+QueryBudgetMiddleware logs a warning (and sets X-Query-Budget) for every
+request that runs more queries than its view declared, so N+1 regressions
+show up before production. Budgets cover the first request on an empty
+database, which also creates the chat user, the conversation and the
+client's rate-limit bucket. max_queries(n) asserts the same in tests and
+scripts:
+
+    with max_queries(2):
+        Client().get('/')
+"""
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+
+from task1 import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit: int):
+    """
+    Declare the maximum number of queries of a view; None means unbounded
+    (long-poll views). Apply it outermost, above decorators such as @condition.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+@contextmanager
+def max_queries(limit: int):
+    """
+    Raise QueryBudgetExceeded, listing the queries, if the block runs more than
+    `limit` queries on any database alias of this thread.
+    """
+    queries = []
+
+    def capture(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    wrappers = [connections[alias].execute_wrapper(capture) for alias in connections]
+    for wrapper in wrappers:
+        wrapper.__enter__()
+    try:
+        yield queries
+    finally:
+        for wrapper in reversed(wrappers):
+            wrapper.__exit__(None, None, None)
+    if len(queries) > limit:
+        listing = '\n'.join(f'{number}. {sql}' for number, sql in enumerate(queries, 1))
+        raise QueryBudgetExceeded(f'{len(queries)} queries, budget is {limit}:\n{listing}')
+
+
+class QueryBudgetMiddleware(MiddlewareMixin):
+    """
+    DEBUG only. Must come after task1.metrics.TimingMiddleware, which counts
+    the queries of the request.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', settings.QUERY_BUDGET_DEFAULT)
+
+    def process_response(self, request, response):
+        budget = getattr(request, 'query_budget', None)
+        count = metrics.query_count()
+        if budget is not None and count > budget:
+            match = request.resolver_match
+            logger.warning('%s ran %d queries, budget is %d', match.view_name if match else request.path,
+                           count, budget)
+            response['X-Query-Budget'] = f'exceeded: {count}/{budget}'
+        return response
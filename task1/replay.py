@@ -0,0 +1,130 @@
+"""
+Bulk replay of a JSONL prompt file (python manage.py replay_prompts).
+
+The file is read line by line, so its size does not matter. Prompts are
+answered in batches by a bounded thread pool, with exponential backoff
+between retries. Each batch is stored as user/bot Post pairs with one
+bulk_create, and the ReplayCheckpoint row records the next line to read and
+the lines of prompts that failed in the same transaction. An interrupted run
+resumes after the last stored batch, and never stores a batch twice; the
+failed prompts are answered again with retry_failed=True (--retry-failed).
+"""
+import json
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Collection
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from task1 import llm
+from task1.answers import build_messages, generate_answer
+from task1.identities import default_conversation, get_bot
+from task1.models import Post, ReplayCheckpoint
+from task1.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def read_prompts(path, field: str = 'prompt', start: int = 0, only: Collection[int] = None):
+    """
+    (line number, prompt) for every non-empty line from line `start` (0-based),
+    or only for the line numbers in `only`. A line is either a JSON object with
+    the prompt in `field` or a JSON string.
+    """
+    with open(path, encoding='utf-8') as lines:
+        for number, line in enumerate(islice(lines, start, None), start):
+            if not line.strip() or (only is not None and number not in only):
+                continue
+            record = json.loads(line)
+            yield number, record if isinstance(record, str) else record[field]
+
+
+def read_checkpoint(name: str) -> ReplayCheckpoint:
+    """
+    The checkpoint `name`, or an unsaved one at line 0 if there is none yet.
+    """
+    return ReplayCheckpoint.objects.using('default').filter(name=name).first() or ReplayCheckpoint(name=name)
+
+
+def answer(prompt: str, retries: int, backoff: float, use_cache: bool = True) -> str:
+    for attempt in range(retries + 1):
+        try:
+            if use_cache:
+                return generate_answer(prompt)
+            return llm.complete(build_messages(prompt))
+        except Exception:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            time.sleep(delay + random.uniform(0, delay))
+
+
+def store(pairs, conversation, checkpoint: str = None, next_line: int = None, retried: Collection[int] = (),
+          failed: Collection[int] = ()) -> None:
+    """
+    Save (prompt, answer) pairs as posts of the conversation owner and the bot,
+    and move the checkpoint to `next_line`, in one transaction. The `retried`
+    lines leave the checkpoint's failed lines and the `failed` ones join them.
+    bulk_create bypasses Post.save, so token_count is filled in here.
+    """
+    bot = get_bot()
+    now = timezone.now()
+    posts = []
+    for prompt, text in pairs:
+        posts.append(Post(author=conversation.owner, conversation=conversation, text=prompt, published_date=now,
+                          token_count=count_tokens(prompt)))
+        posts.append(Post(author=bot, conversation=conversation, text=text, published_date=now,
+                          token_count=count_tokens(text)))
+    with transaction.atomic(using='default'):
+        Post.objects.bulk_create(posts)
+        if checkpoint is not None:
+            row = read_checkpoint(checkpoint)
+            row.next_line = max(row.next_line, next_line)
+            row.failed_lines = sorted(set(row.failed_lines).difference(retried).union(failed))
+            row.save(using='default')
+
+
+def replay(path, field: str = 'prompt', concurrency: int = None, batch_size: int = 100, retries: int = 3,
+           backoff: float = 1.0, use_cache: bool = True, checkpoint=None, conversation=None, retry_failed: bool = False,
+           stdout=None) -> dict:
+    """
+    Answer every prompt of the JSONL file at `path` from the checkpoint on and
+    store the pairs in `conversation` (by default the anonymous chat's). The
+    checkpoint is named by `checkpoint`, by default the absolute file path.
+    Prompts that still fail after `retries` retries are logged and their lines
+    recorded in the checkpoint; with `retry_failed` only those are answered.
+    Returns counters: stored pairs and failed prompts.
+    """
+    checkpoint = checkpoint or str(Path(path).resolve())
+    concurrency = concurrency or settings.LLM_WORKERS
+    conversation = conversation or default_conversation()
+    counters = {'stored': 0, 'failed': 0}
+    start = read_checkpoint(checkpoint)
+    if retry_failed:
+        prompts = read_prompts(path, field, only=set(start.failed_lines))
+    else:
+        prompts = read_prompts(path, field, start.next_line)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay') as executor:
+        while batch := list(islice(prompts, batch_size)):
+            futures = [executor.submit(answer, prompt, retries, backoff, use_cache) for _, prompt in batch]
+            pairs, failed = [], []
+            for (number, prompt), future in zip(batch, futures):
+                try:
+                    pairs.append((prompt, future.result()))
+                except Exception:
+                    logger.exception('Prompt on line %s failed', number + 1)
+                    failed.append(number)
+            next_line = start.next_line if retry_failed else batch[-1][0] + 1
+            store(pairs, conversation, checkpoint, next_line, retried=[number for number, _ in batch], failed=failed)
+            counters['failed'] += len(failed)
+            counters['stored'] += len(pairs)
+            if stdout is not None:
+                stdout.write(f"Stored {counters['stored']} pairs (line {batch[-1][0] + 1})")
+    return counters
@@ -0,0 +1,21 @@
+class ReadWriteRouter:
+    """
+    Sends reads of chat data (task1 models) to the read-only 'readonly'
+    connection and every write to 'default', the single writer. Both aliases
+    open the same SQLite file, so relations between them are allowed.
+    """
+    read_apps = {'task1'}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in self.read_apps:
+            return 'readonly'
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
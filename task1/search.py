@@ -0,0 +1,72 @@
+"""
+Full-text search over chat history, backed by the task1_post_fts FTS5 table
+and ranked with bm25. The table is an external-content index over task1_post
+kept in sync by triggers (see migration 0013_post_fts_external_content).
+"""
+import re
+
+from django.db import connections, router, transaction
+
+from task1.models import Post
+
+FTS_TABLE = 'task1_post_fts'
+
+
+def match_expression(query: str) -> str:
+    """
+    FTS5 MATCH expression for free-form user input: every word must occur, and
+    the last one is matched as a prefix. Words are quoted, so FTS5 query
+    syntax in the input is treated as plain text.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return ''
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def search(query: str, limit: int = 20, conversation=None) -> list:
+    """
+    Posts of `conversation` (all posts if None) matching `query`, best match
+    first; each has a `snippet` attribute with the matched words wrapped in [ ].
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+
+    join, scope, params = '', '', [expression]
+    if conversation is not None:
+        # Совпадения FTS проверяются по первичному ключу, без чтения всего разговора
+        join = f'JOIN {Post._meta.db_table} post ON post.id = {FTS_TABLE}.rowid '
+        scope = 'AND post.conversation_id = %s '
+        params.append(conversation.pk)
+
+    db = router.db_for_read(Post)
+    with connections[db].cursor() as cursor:
+        cursor.execute(
+            f"SELECT {FTS_TABLE}.rowid, snippet({FTS_TABLE}, 0, '[', ']', '…', 12) FROM {FTS_TABLE} {join}"
+            f"WHERE {FTS_TABLE} MATCH %s {scope}ORDER BY bm25({FTS_TABLE}) LIMIT %s",
+            [*params, limit],
+        )
+        hits = cursor.fetchall()
+
+    posts = Post.objects.using(db).select_related('author').in_bulk([post_id for post_id, _ in hits])
+    results = []
+    for post_id, snippet in hits:
+        post = posts.get(post_id)
+        if post is not None:
+            post.snippet = snippet
+            results.append(post)
+    return results
+
+
+def rebuild() -> int:
+    """
+    Rebuild the index from task1_post in one transaction, e.g. after a
+    migration rebuilt the table and the triggers had to be recreated.
+    Returns the number of indexed posts.
+    """
+    with transaction.atomic(using='default'), connections['default'].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {Post._meta.db_table}')
+        return cursor.fetchone()[0]
@@ -0,0 +1,182 @@
+"""
+Static asset pipeline for production (pythonProject.settings_production).
+
+python manage.py collectstatic is the build step: CompressedManifestStaticFilesStorage
+strips the selectors our templates never use from settings.STATIC_PURGE
+stylesheets, fingerprints every file (bootstrap.min.css -> bootstrap.min.<hash>.css)
+and writes a .gz variant next to each compressible one. serve() hands the
+files out of STATIC_ROOT in-process, picking the gzip variant when the client
+accepts it; fingerprinted names never change content, so they are cached as
+immutable.
+"""
+import gzip
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.files.base import ContentFile
+from django.views import static
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.txt', '.html', '.json')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+ATTRIBUTE_RE = re.compile(r'\[[^\]]*\]')
+NEGATION_RE = re.compile(r':(?:not|is|where)\([^()]*\)')
+NAME_RE = re.compile(r'[.#](-?[_a-zA-Z][\w-]*)')
+
+
+def used_names() -> set:
+    """
+    Every word in the STATIC_PURGE_CONTENT files, plus STATIC_PURGE_SAFELIST:
+    a superset of the classes and ids the pages can use.
+    """
+    names = set(settings.STATIC_PURGE_SAFELIST)
+    for directory in settings.STATIC_PURGE_CONTENT:
+        for path in Path(directory).rglob('*'):
+            if path.is_file():
+                names.update(re.findall(r'[\w-]+', path.read_text(encoding='utf-8', errors='ignore')))
+    return names
+
+
+def _statements(css: str):
+    """
+    Top-level statements of a stylesheet: (prelude, block body) for rules and
+    at-rules with a block, (statement, None) for the rest (@import, @charset).
+    """
+    start = depth = 0
+    quote = None
+    i = 0
+    while i < len(css):
+        char = css[i]
+        if quote:
+            if char == '\\':
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '{':
+            if depth == 0:
+                brace = i
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                yield css[start:brace].strip(), css[brace + 1:i]
+                start = i + 1
+        elif char == ';' and depth == 0:
+            yield css[start:i].strip(), None
+            start = i + 1
+        i += 1
+
+
+def _split_selectors(prelude: str):
+    selectors, depth, start = [], 0, 0
+    for i, char in enumerate(prelude):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(prelude[start:i].strip())
+            start = i + 1
+    selectors.append(prelude[start:].strip())
+    return selectors
+
+
+def _selector_used(selector: str, used: set) -> bool:
+    # Классы внутри :not(...) и атрибутов не обязаны встречаться в шаблонах
+    bare = NEGATION_RE.sub('', ATTRIBUTE_RE.sub('', selector))
+    return all(name in used for name in NAME_RE.findall(bare))
+
+
+def purge_css(css: str, used: set) -> str:
+    """
+    Drop the style rules whose selectors reference classes or ids outside
+    `used`. Conditional group rules (@media, @supports...) are purged
+    recursively; other at-rules (@font-face, @keyframes) are kept as is.
+    """
+    output = []
+    for prelude, body in _statements(COMMENT_RE.sub('', css)):
+        if body is None:
+            if prelude:
+                output.append(prelude + ';')
+        elif prelude.startswith(('@media', '@supports', '@layer', '@container')):
+            inner = purge_css(body, used)
+            if inner:
+                output.append(f'{prelude}{{{inner}}}')
+        elif prelude.startswith('@'):
+            output.append(f'{prelude}{{{body}}}')
+        else:
+            selectors = [selector for selector in _split_selectors(prelude) if _selector_used(selector, used)]
+            if selectors:
+                output.append(f"{','.join(selectors)}{{{body}}}")
+    return ''.join(output)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            used = used_names()
+            for name in settings.STATIC_PURGE:
+                if name in paths:
+                    storage, path = paths[name]
+                    with storage.open(path) as source:
+                        css = purge_css(source.read().decode(), used)
+                    self.delete(name)
+                    self.save(name, ContentFile(css.encode()))
+                    paths[name] = (self, name)
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        if not dry_run:
+            for hashed_name in set(self.hashed_files.values()):
+                if hashed_name.endswith(COMPRESSIBLE):
+                    self.compress(hashed_name)
+
+    def compress(self, name):
+        with self.open(name) as source:
+            content = source.read()
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < len(content):
+            if self.exists(name + '.gz'):
+                self.delete(name + '.gz')
+            self.save(name + '.gz', ContentFile(compressed))
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            if content is not None:
+                raise
+            # Ссылка из CSS на несуществующий файл (url("w.jpg") в chat.css) остаётся как есть
+            return name
+
+    def stored_name(self, name):
+        # До первого collectstatic манифеста нет: отдаём исходные имена
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+
+@lru_cache(maxsize=None)
+def fingerprinted() -> frozenset:
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def serve(request, path):
+    """
+    Serve a collected static file, gzip-encoded when the client accepts it.
+    """
+    name = path
+    accepts_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    if accepts_gzip and (Path(settings.STATIC_ROOT) / (path + '.gz')).is_file():
+        name = path + '.gz'
+    response = static.serve(request, name, document_root=settings.STATIC_ROOT)
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = IMMUTABLE if path in fingerprinted() else 'no-cache'
+    return response
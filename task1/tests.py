@@ -1,3 +1,771 @@
-# from django.test import TestCase
+import gzip
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from task1 import admission, answer_cache, answers, archive, identities, jobs, llm, replay, staticfiles, views
+from task1.context import history_messages, prompt_history
+from task1.fake_llm import start_in_thread
+from task1.identities import default_conversation, get_bot, get_me
+from task1.models import Conversation, Job, LlmCallSlot, Post
+from task1.pagination import ARCHIVE_CURSOR_PREFIX, PAGE_SIZE, decode_cursor, encode_cursor, page_before
+from task1.querybudget import max_queries
+from task1.search import FTS_TABLE, rebuild, search
+from task1.tokens import count_tokens
+
+
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Every chat view stays within the budget its @query_budget declares, also
+    on the first request of a process, when the chat user, the bot and the
+    conversation are not cached yet. Reads go through the 'readonly' mirror,
+    which only sees committed rows, hence TransactionTestCase.
+    """
+    databases = {'default', 'readonly'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.llm_server = start_in_thread(port=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.llm_server.shutdown()
+        cls.llm_server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings_override = override_settings(
+            ARCHIVE_DIR=archive_dir.name, ADMISSION_RATE=1000, ADMISSION_BURST=1000, LLM_CACHE_ALIAS='default',
+            LLM_API_KEY='fake', LLM_BASE_URL='http://%s:%d/v1' % self.llm_server.server_address)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        llm.reset()
+        self.addCleanup(llm.reset)
+        identities.reset()
+        self.addCleanup(identities.reset)
+
+    def add_posts(self, count):
+        me, conversation = get_me(), default_conversation()
+        start = timezone.now() - timedelta(minutes=count)
+        Post.objects.bulk_create(Post(author=me, conversation=conversation, text=f'message {i}',
+                                      published_date=start + timedelta(minutes=i)) for i in range(count))
+        identities.reset()
+
+    def assertWithinBudget(self, view, method, url, data=None, **headers):
+        with max_queries(view.query_budget):
+            response = getattr(self.client, method)(url, data, headers=headers)
+        self.assertLess(response.status_code, 400)
+        return response
+
+    def test_home_first_request(self):
+        self.assertWithinBudget(views.home, 'get', reverse('home'))
+
+    def test_home_with_history(self):
+        self.add_posts(PAGE_SIZE * 2)
+        response = self.assertWithinBudget(views.home, 'get', reverse('home'))
+        self.assertEqual(len(response.context['posts']), PAGE_SIZE)
+
+    def test_history_first_request(self):
+        response = self.assertWithinBudget(views.history, 'get', reverse('history'))
+        self.assertEqual(response.json(), {'posts': [], 'next': None})
+
+    def test_history_page(self):
+        self.add_posts(PAGE_SIZE * 2)
+        cursor = self.client.get(reverse('home')).context['history_cursor']
+        identities.reset()
+        response = self.assertWithinBudget(views.history, 'get', reverse('history'), {'before': cursor})
+        self.assertEqual(len(response.json()['posts']), PAGE_SIZE)
+
+    def test_history_into_empty_archive(self):
+        self.add_posts(PAGE_SIZE // 2)
+        self.assertIsNone(self.client.get(reverse('home')).context['history_cursor'])
+        identities.reset()
+        response = self.assertWithinBudget(views.history, 'get', reverse('history'), {'before': ARCHIVE_CURSOR_PREFIX})
+        self.assertEqual(response.json(), {'posts': [], 'next': None})
+
+    def test_messages_first_request(self):
+        response = self.assertWithinBudget(views.messages, 'get', reverse('messages'))
+        self.assertEqual(response.json(), {'posts': [], 'more': False})
+
+    def test_messages(self):
+        self.add_posts(PAGE_SIZE + 1)
+        response = self.assertWithinBudget(views.messages, 'get', reverse('messages'), {'after': 0})
+        self.assertTrue(response.json()['more'])
+
+    def test_messages_not_modified(self):
+        self.add_posts(3)
+        etag = self.client.get(reverse('messages'))['ETag']
+        identities.reset()
+        response = self.assertWithinBudget(views.messages, 'get', reverse('messages'), if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_addpage(self):
+        response = self.assertWithinBudget(views.addpage, 'post', reverse('addpage'), {'field_text': 'hello'},
+                                           accept='application/json')
+        self.assertEqual(response.status_code, 202)
+
+    def test_addpage_stream(self):
+        async def read(response):
+            return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        # Ответ сохраняется в конце потока, поэтому поток читается внутри бюджета
+        with max_queries(views.addpage_stream.query_budget):
+            response = self.client.post(reverse('addpage_stream'), {'field_text': 'hello'})
+            events = async_to_sync(read)(response)
+        self.assertIn('event: done', events)
+
+
+@override_settings(ADMISSION_RATE=0.5, ADMISSION_BURST=2, ADMISSION_MAX_LLM_CALLS=2, LLM_JOB_STALE_AFTER=300)
+class AdmissionTests(TransactionTestCase):
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        identities.reset()
+        self.addCleanup(identities.reset)
+
+    def test_bucket_exhaustion_and_refill(self):
+        self.assertEqual(admission.take('ip:a', 0.5, 2, now=100), 0)
+        self.assertEqual(admission.take('ip:a', 0.5, 2, now=100), 0)
+        self.assertAlmostEqual(admission.take('ip:a', 0.5, 2, now=100), 2)
+        self.assertAlmostEqual(admission.take('ip:a', 0.5, 2, now=101), 1)
+        self.assertEqual(admission.take('ip:a', 0.5, 2, now=102), 0)
+        # Пополнение не превышает burst
+        self.assertEqual(admission.take('ip:a', 0.5, 2, now=1000), 0)
+        self.assertEqual(admission.take('ip:a', 0.5, 2, now=1000), 0)
+        self.assertGreater(admission.take('ip:a', 0.5, 2, now=1000), 0)
+        # У другого клиента свой бакет
+        self.assertEqual(admission.take('ip:b', 0.5, 2, now=1000), 0)
+
+    def test_too_many_requests(self):
+        for _ in range(2):
+            response = self.client.post(reverse('addpage_stream'), {'field_text': ''})
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('addpage_stream'), {'field_text': ''})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+        response = self.client.post(reverse('addpage_stream'), {'field_text': ''},
+                                    headers={'accept': 'application/json'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('error', response.json())
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+    def test_get_is_not_limited(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+
+    def test_llm_call_cap(self):
+        first = admission.acquire_llm_slot(now=100)
+        self.assertIsNotNone(admission.acquire_llm_slot(now=100))
+        self.assertIsNone(admission.acquire_llm_slot(now=100))
+        admission.release_llm_slot(first)
+        self.assertIsNotNone(admission.acquire_llm_slot(now=100))
+
+    def test_stale_slots_are_reclaimed(self):
+        admission.acquire_llm_slot(now=100)
+        admission.acquire_llm_slot(now=100)
+        slot = admission.acquire_llm_slot(now=401)
+        self.assertIsNotNone(slot)
+        admission.release_llm_slot(slot, now=401)
+        self.assertFalse(LlmCallSlot.objects.exists())
+
+    def test_running_jobs_count_against_the_cap(self):
+        prompt = Post.objects.create(author=get_me(), conversation=default_conversation(), text='hello')
+        Job.objects.create(prompt=prompt, status=Job.RUNNING)
+        Job.objects.create(prompt=prompt)
+        self.assertIsNotNone(admission.acquire_llm_slot())
+        self.assertIsNone(admission.acquire_llm_slot())
+        response = self.client.post(reverse('addpage_stream'), {'field_text': 'hi'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '5')
+        # Воркер тоже не берёт задачу сверх лимита
+        self.assertIsNone(jobs.claim_next())
+
+
+class ReplayTests(TransactionTestCase):
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        identities.reset()
+        self.addCleanup(identities.reset)
+        prompts = tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8')
+        self.addCleanup(os.unlink, prompts.name)
+        with prompts:
+            for i in range(7):
+                prompts.write(json.dumps({'prompt': f'prompt {i}'}) + '\n')
+        self.path = prompts.name
+
+    def replay(self, **kwargs):
+        return replay.replay(self.path, concurrency=2, batch_size=3, retries=0, backoff=0, **kwargs)
+
+    def stored_prompts(self):
+        return list(Post.objects.exclude(author=get_bot()).order_by('id').values_list('text', flat=True))
+
+    def test_resume_after_interruption(self):
+        store = replay.store
+
+        def stop_at_third_batch(*args, **kwargs):
+            if store_mock.call_count == 3:
+                raise KeyboardInterrupt
+            store(*args, **kwargs)
+
+        with mock.patch.object(replay, 'answer', lambda prompt, *args: prompt.upper()), \
+                mock.patch.object(replay, 'store', side_effect=stop_at_third_batch) as store_mock, \
+                self.assertRaises(KeyboardInterrupt):
+            self.replay()
+        self.assertEqual(replay.read_checkpoint(str(Path(self.path).resolve())).next_line, 6)
+
+        with mock.patch.object(replay, 'answer', lambda prompt, *args: prompt.upper()):
+            self.assertEqual(self.replay(), {'stored': 1, 'failed': 0})
+        self.assertEqual(self.stored_prompts(), [f'prompt {i}' for i in range(7)])
+        self.assertEqual(Post.objects.filter(author=get_bot(), text='PROMPT 6').count(), 1)
+
+    def test_failed_prompts_are_retried(self):
+        def flaky(prompt, *args):
+            if prompt in ('prompt 1', 'prompt 5'):
+                raise RuntimeError('upstream error')
+            return prompt.upper()
+
+        with mock.patch.object(replay, 'answer', flaky), self.assertLogs('task1.replay', 'ERROR'):
+            self.assertEqual(self.replay(), {'stored': 5, 'failed': 2})
+        checkpoint = replay.read_checkpoint(str(Path(self.path).resolve()))
+        self.assertEqual((checkpoint.next_line, checkpoint.failed_lines), (7, [1, 5]))
+
+        with mock.patch.object(replay, 'answer', lambda prompt, *args: prompt.upper()):
+            self.assertEqual(self.replay(retry_failed=True), {'stored': 2, 'failed': 0})
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.next_line, checkpoint.failed_lines), (7, []))
+        self.assertEqual(sorted(self.stored_prompts()), [f'prompt {i}' for i in range(7)])
+
+
+class PaginationTests(TransactionTestCase):
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        identities.reset()
+        self.addCleanup(identities.reset)
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings_override = override_settings(ARCHIVE_DIR=archive_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.conversation = default_conversation()
+
+    def add_post(self, text, published_date):
+        return Post.objects.create(author=get_me(), conversation=self.conversation, text=text,
+                                   published_date=published_date)
+
+    def add_history(self):
+        """
+        Posts in chronological order: two undated ones, then dated ones where
+        three share a timestamp and are ordered by id.
+        """
+        start = timezone.now() - timedelta(days=1)
+        tie = start + timedelta(minutes=2)
+        return [self.add_post('undated 0', None), self.add_post('undated 1', None),
+                self.add_post('first', start), self.add_post('tie 0', tie), self.add_post('tie 1', tie),
+                self.add_post('tie 2', tie), self.add_post('last', tie + timedelta(seconds=1))]
+
+    def read_history(self, limit):
+        queryset = Post.objects.filter(conversation=self.conversation)
+        pages, cursor = [], None
+        while True:
+            posts, cursor = page_before(queryset, cursor, limit)
+            pages.append([post.text for post in posts])
+            if cursor is None:
+                return pages
+
+    def test_cursor_round_trip(self):
+        dated, undated = self.add_post('dated', timezone.now()), self.add_post('undated', None)
+        self.assertEqual(decode_cursor(encode_cursor(dated)), (dated.published_date, dated.id))
+        self.assertEqual(decode_cursor(encode_cursor(undated)), (None, undated.id))
+        for cursor in ('', 'not a cursor', encode_cursor(dated)[:-2] + '!!'):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+        response = self.client.get(reverse('history'), {'before': 'not a cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pages_cover_history_once(self):
+        texts = [post.text for post in self.add_history()]
+        for limit in (1, 2, 3, len(texts), len(texts) + 1):
+            with self.subTest(limit=limit):
+                pages = self.read_history(limit)
+                self.assertTrue(all(0 < len(page) <= limit for page in pages))
+                # Страницы идут от новых к старым, посты внутри страницы — по времени
+                self.assertEqual([text for page in reversed(pages) for text in page], texts)
+
+    def test_ties_are_split_between_pages(self):
+        self.add_history()
+        self.assertEqual(self.read_history(2), [['tie 2', 'last'], ['tie 0', 'tie 1'], ['undated 1', 'first'],
+                                                ['undated 0']])
+
+    def test_before_past_the_last_page(self):
+        oldest = self.add_history()[0]
+        queryset = Post.objects.filter(conversation=self.conversation)
+        self.assertEqual(page_before(queryset, encode_cursor(oldest)), ([], None))
+        response = self.client.get(reverse('history'), {'before': encode_cursor(oldest)})
+        self.assertEqual(response.json(), {'posts': [], 'next': None})
+
+
+class ArchiveTests(TransactionTestCase):
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        identities.reset()
+        self.addCleanup(identities.reset)
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings_override = override_settings(ARCHIVE_DIR=archive_dir.name, ARCHIVE_AFTER_DAYS=30)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def add_posts(self, texts, start):
+        me, conversation = get_me(), default_conversation()
+        for i, text in enumerate(texts):
+            Post.objects.create(author=me, conversation=conversation, text=text,
+                                published_date=start + timedelta(hours=i))
+
+    def read_history(self):
+        """
+        Texts of every page the chat page would load, oldest first.
+        """
+        response = self.client.get(reverse('home'))
+        texts = [post.text for post in response.context['posts']]
+        cursor = response.context['history_cursor']
+        while cursor:
+            data = self.client.get(reverse('history'), {'before': cursor}).json()
+            texts = [post['text'] for post in data['posts']] + texts
+            cursor = data['next']
+        return texts
+
+    def test_segments_are_compressed(self):
+        text = 'archived ' * 20
+        self.add_posts([text, 'undated'], timezone.now() - timedelta(days=60))
+        Post.objects.filter(text='undated').update(published_date=None)
+        self.assertEqual(archive.archive_posts(), 2)
+        self.assertFalse(Post.objects.exists())
+
+        self.assertEqual({path.name for path in archive.segments()},
+                         {archive.segment_name(timezone.now() - timedelta(days=60)), archive.UNDATED_SEGMENT})
+        for path in archive.segments():
+            conn = sqlite3.connect(path)
+            self.addCleanup(conn.close)
+            (stored,), = conn.execute('SELECT text FROM posts').fetchall()
+            self.assertNotIn(b'archived', stored)
+        posts = archive.page_before(default_conversation(), limit=10)
+        self.assertEqual([post.text for post in posts], [text, 'undated'])
+
+    def test_history_falls_through_to_the_archive(self):
+        old = [f'old {i}' for i in range(PAGE_SIZE + 3)]
+        new = [f'new {i}' for i in range(PAGE_SIZE + 5)]
+        self.add_posts(old, timezone.now() - timedelta(days=90))
+        self.add_posts(new, timezone.now() - timedelta(days=1))
+        archive.archive_posts()
+        self.assertEqual(Post.objects.count(), len(new))
+        self.assertEqual(self.read_history(), old + new)
+
+    def test_no_archive_cursor_without_archived_posts(self):
+        self.add_posts(['old'], timezone.now() - timedelta(days=90))
+        self.add_posts(['new'], timezone.now() - timedelta(days=1))
+        self.assertIsNone(self.client.get(reverse('home')).context['history_cursor'])
+        archive.archive_posts()
+        self.assertEqual(self.client.get(reverse('home')).context['history_cursor'], ARCHIVE_CURSOR_PREFIX +
+                         encode_cursor(Post.objects.get()))
+        self.assertEqual(self.read_history(), ['old', 'new'])
+
+
+class SearchTests(TransactionTestCase):
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        identities.reset()
+        self.addCleanup(identities.reset)
+
+    def assertIndexInSync(self):
+        # integrity-check с rank=1 сверяет индекс с содержимым task1_post
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('integrity-check', 1)")
+
+    def found(self, query, conversation=None):
+        return [post.text for post in search(query, conversation=conversation)]
+
+    def test_triggers_keep_the_index_in_sync(self):
+        post = Post.objects.create(author=get_me(), conversation=default_conversation(), text='Crème brûlée recipe')
+        self.assertEqual(self.found('creme brul'), ['Crème brûlée recipe'])
+        self.assertIndexInSync()
+
+        post.text = 'Apple pie recipe'
+        post.save(update_fields=['text'])
+        self.assertEqual(self.found('creme'), [])
+        self.assertEqual(self.found('apple'), ['Apple pie recipe'])
+        self.assertIndexInSync()
+
+        Post.objects.filter(pk=post.pk).update(published_date=timezone.now())
+        self.assertEqual(self.found('recipe'), ['Apple pie recipe'])
+        post.delete()
+        self.assertEqual(self.found('recipe'), [])
+        self.assertIndexInSync()
+
+    def test_rebuild(self):
+        Post.objects.create(author=get_me(), conversation=default_conversation(), text='kept after rebuild')
+        self.assertEqual(rebuild(), 1)
+        self.assertEqual(self.found('rebuild'), ['kept after rebuild'])
+        self.assertIndexInSync()
+
+    def test_results_are_limited_to_the_conversation(self):
+        other_user = get_user_model().objects.create(username='other')
+        other = Conversation.objects.create(owner=other_user)
+        Post.objects.create(author=get_me(), conversation=default_conversation(), text='shared word mine')
+        Post.objects.create(author=other_user, conversation=other, text='shared word theirs')
+        self.assertEqual(self.found('shared', default_conversation()), ['shared word mine'])
+        self.assertEqual(self.found('shared', other), ['shared word theirs'])
+        self.assertEqual(len(self.found('shared')), 2)
+
+        response = self.client.get(reverse('search'), {'q': 'shared'})
+        self.assertEqual([post['text'] for post in response.json()['posts']], ['shared word mine'])
+        self.client.force_login(other_user)
+        response = self.client.get(reverse('search'), {'q': 'shared'})
+        self.assertEqual([post['text'] for post in response.json()['posts']], ['shared word theirs'])
+
+
+@override_settings(LLM_JOB_MAX_ATTEMPTS=2, LLM_JOB_STALE_AFTER=300, ADMISSION_MAX_LLM_CALLS=100)
+class JobTests(TransactionTestCase):
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        identities.reset()
+        self.addCleanup(identities.reset)
+
+    def enqueue(self, count=1):
+        me, conversation = get_me(), default_conversation()
+        return [jobs.enqueue(Post.objects.create(author=me, conversation=conversation, text=f'prompt {i}'))
+                for i in range(count)]
+
+    def test_workers_do_not_claim_the_same_job(self):
+        queued = self.enqueue(30)
+        claimed, errors = [], []
+        start = threading.Barrier(4)
+
+        def worker():
+            try:
+                start.wait()
+                while (job := jobs.claim_next()) is not None:
+                    claimed.append(job.pk)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(claimed), [job.pk for job in queued])
+        self.assertEqual(Job.objects.filter(status=Job.RUNNING, attempts=1).count(), len(queued))
+
+    def test_failed_job_is_retried_then_failed(self):
+        job, = self.enqueue()
+        with mock.patch.object(jobs, 'generate_answer', side_effect=RuntimeError('upstream error')), \
+                self.assertLogs('task1.jobs', 'ERROR'):
+            jobs.run(jobs.claim_next())
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.error), (Job.PENDING, 1, 'upstream error'))
+            jobs.run(jobs.claim_next())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNone(jobs.claim_next())
+
+    def test_retried_job_is_answered(self):
+        job, = self.enqueue()
+        with mock.patch.object(jobs, 'generate_answer', side_effect=[RuntimeError('upstream error'), 'answer']), \
+                self.assertLogs('task1.jobs', 'ERROR'):
+            jobs.run(jobs.claim_next())
+            jobs.run(jobs.claim_next())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error, job.answer.text), (Job.DONE, 2, '', 'answer'))
+
+    def test_stale_running_jobs_are_requeued(self):
+        stale, fresh = self.enqueue(2)
+        jobs.claim_next(), jobs.claim_next()
+        Job.objects.filter(pk=stale.pk).update(started_at=timezone.now() - timedelta(seconds=301))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(Job.objects.get(pk=stale.pk).status, Job.PENDING)
+        self.assertEqual(Job.objects.get(pk=fresh.pk).status, Job.RUNNING)
+        self.assertEqual(jobs.claim_next().pk, stale.pk)
+
+    def test_supervisor_requeues_stale_jobs_periodically(self):
+        stop = threading.Event()
+        checks = []
+
+        def requeue_stale():
+            checks.append(time.monotonic())
+            if len(checks) == 3:
+                stop.set()
+            return 0
+
+        with mock.patch.object(jobs, 'requeue_stale', requeue_stale), \
+                mock.patch.object(jobs, 'STALE_CHECK_INTERVAL', 0):
+            jobs.run_workers(1, poll_interval=0.01, stop=stop)
+        # Первая проверка при старте, остальные — пока воркеры работают
+        self.assertGreaterEqual(len(checks), 3)
+
+
+@override_settings(LLM_CACHE_ALIAS='default', LLM_CACHE_SIZE=2, LLM_CACHE_TTL=60)
+class AnswerCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        answer_cache.clear()
+        self.addCleanup(answer_cache.clear)
+        self.stats = answer_cache.stats()
+        self.now = 1000.0
+        clock = mock.patch.object(answer_cache, 'time', mock.Mock(monotonic=lambda: self.now))
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def assertEvents(self, **expected):
+        stats = answer_cache.stats()
+        self.assertEqual({event: stats[event] - self.stats[event] for event in expected}, expected)
+
+    def test_lru_eviction(self):
+        answer_cache.set('a', 'model', '', 'answer a')
+        answer_cache.set('b', 'model', '', 'answer b')
+        self.assertEqual(answer_cache.get('a', 'model'), 'answer a')
+        answer_cache.set('c', 'model', '', 'answer c')
+        self.assertEqual(answer_cache.stats()['size'], 2)
+        self.assertEvents(evictions=1, hits=1)
+        # "b" вытеснен как самый давно использованный, но остался во втором уровне
+        self.assertEqual(answer_cache.get('b', 'model'), 'answer b')
+        self.assertEqual(answer_cache.get('c', 'model'), 'answer c')
+        self.assertEvents(evictions=2, hits=2, persistent_hits=1)
+
+    def test_ttl(self):
+        answer_cache.set('a', 'model', '', 'answer a')
+        self.now += 59
+        self.assertEqual(answer_cache.get('a', 'model'), 'answer a')
+        self.assertEvents(hits=1, expirations=0)
+        self.now += 2
+        self.assertEqual(answer_cache.get('a', 'model'), 'answer a')
+        self.assertEvents(hits=1, expirations=1, persistent_hits=1)
+
+    def test_fall_through_to_second_tier(self):
+        # Ответ, сохранённый другим процессом, есть только во втором уровне
+        caches['default'].set(answer_cache.make_key(' Hello  World', 'model'), 'hi')
+        self.assertEqual(answer_cache.get('hello world', 'model'), 'hi')
+        self.assertEqual(answer_cache.get('hello world', 'model'), 'hi')
+        self.assertIsNone(answer_cache.get('hello world', 'other model'))
+        self.assertEvents(persistent_hits=1, hits=1, misses=1)
+
+    def test_empty_streamed_answer_is_not_cached(self):
+        async def read(prompt):
+            return [token async for token in answers.stream_answer(prompt)]
+
+        def stream(tokens):
+            async def fake_stream(messages):
+                for token in tokens:
+                    yield token
+            return fake_stream
+
+        with mock.patch.object(llm, 'stream', stream([])):
+            self.assertEqual(async_to_sync(read)('empty'), [])
+        self.assertIsNone(answer_cache.get('empty', settings.LLM_MODEL, answers.SYSTEM_PROMPT))
+        with mock.patch.object(llm, 'stream', stream(['an', 'swer'])):
+            self.assertEqual(async_to_sync(read)('full'), ['an', 'swer'])
+        self.assertEqual(answer_cache.get('full', settings.LLM_MODEL, answers.SYSTEM_PROMPT), 'answer')
+
+
+class ConversationTests(TransactionTestCase):
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        identities.reset()
+        self.addCleanup(identities.reset)
+        self.user = get_user_model().objects.create(username='alice')
+
+    def test_one_conversation_per_owner(self):
+        conversation = identities._get_conversation(self.user)
+        self.assertEqual(identities._get_conversation(self.user), conversation)
+        with self.assertRaises(IntegrityError):
+            Conversation.objects.create(owner=self.user)
+        self.assertEqual(Conversation.objects.filter(owner=self.user).count(), 1)
+
+    def test_concurrent_first_requests(self):
+        conversations, errors = [], []
+        start = threading.Barrier(8)
+
+        def first_request():
+            try:
+                start.wait()
+                conversations.append(identities._get_conversation(self.user).pk)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=first_request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(conversations), 8)
+        self.assertEqual(len(set(conversations)), 1)
+        self.assertEqual(Conversation.objects.filter(owner=self.user).count(), 1)
+
+    def test_posts_are_filtered_by_conversation(self):
+        mine = Post.objects.create(author=self.user, conversation=identities._get_conversation(self.user),
+                                   text='mine', published_date=timezone.now())
+        Post.objects.create(author=get_me(), conversation=default_conversation(), text='anonymous',
+                            published_date=timezone.now())
+        self.client.force_login(self.user)
+        self.assertEqual([post['text'] for post in self.client.get(reverse('messages')).json()['posts']], ['mine'])
+        self.assertEqual([post.text for post in self.client.get(reverse('home')).context['posts']], ['mine'])
+        self.assertEqual([post['text'] for post in self.client.get(reverse('search'), {'q': 'mine'}).json()['posts']],
+                         ['mine'])
+        self.assertEqual(self.client.get(reverse('search'), {'q': 'anonymous'}).json()['posts'], [])
+
+        self.client.logout()
+        self.assertEqual([post['text'] for post in self.client.get(reverse('messages')).json()['posts']],
+                         ['anonymous'])
+        # Курсор новее всех постов не выводит историю за пределы разговора
+        cursor = encode_cursor(Post(id=mine.id + 1, published_date=timezone.now() + timedelta(days=1)))
+        response = self.client.get(reverse('history'), {'before': cursor})
+        self.assertEqual([post['text'] for post in response.json()['posts']], ['anonymous'])
+
+
+class HistoryBudgetTests(TransactionTestCase):
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        identities.reset()
+        self.addCleanup(identities.reset)
+
+    def add_turns(self, count):
+        me, bot, conversation = get_me(), get_bot(), default_conversation()
+        start = timezone.now() - timedelta(hours=1)
+        return [Post.objects.create(author=bot if i % 2 else me, conversation=conversation, text=f'turn {i} ' * (i + 1),
+                                    published_date=start + timedelta(minutes=i)) for i in range(count)]
+
+    def test_newest_turns_within_budget(self):
+        *turns, prompt, later = self.add_turns(12)
+        # Старые посты без сохранённого token_count считаются на лету
+        Post.objects.filter(pk=turns[-1].pk).update(token_count=None)
+        system = 'You are a helpful assistant'
+        budget = sum(count_tokens(post.text) for post in turns[-4:])
+        with self.settings(LLM_CONTEXT_TOKENS=budget + count_tokens(system) + count_tokens(prompt.text)):
+            messages = prompt_history(prompt, system)
+
+        self.assertEqual([message['content'] for message in messages], [post.text for post in turns[-4:]])
+        self.assertEqual([message['role'] for message in messages], ['user', 'assistant', 'user', 'assistant'])
+        self.assertLessEqual(sum(count_tokens(message['content']) for message in messages), budget)
+
+    def test_budget_smaller_than_the_newest_turn(self):
+        *turns, prompt = self.add_turns(4)
+        self.assertEqual(history_messages(prompt, count_tokens(turns[-1].text) - 1), [])
+        self.assertEqual(history_messages(prompt, 0), [])
+
+
+class StaticFilesTests(TransactionTestCase):
+    """
+    Smoke test of the production build step: collectstatic through
+    CompressedManifestStaticFilesStorage, then the pages and serve().
+    """
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        identities.reset()
+        self.addCleanup(identities.reset)
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        self.static_root = Path(static_root.name)
+        settings_override = override_settings(STATIC_ROOT=self.static_root, STORAGES={
+            **settings.STORAGES, 'staticfiles': {'BACKEND': 'task1.staticfiles.CompressedManifestStaticFilesStorage'}})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        staticfiles.fingerprinted.cache_clear()
+        self.addCleanup(staticfiles.fingerprinted.cache_clear)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def stylesheet_url(self):
+        html = self.client.get(reverse('home')).content.decode()
+        url, = re.findall(r'href="(/static/bootstrap/css/bootstrap\.min\.[0-9a-f]{12}\.css)"', html)
+        return url
+
+    def test_purged_css_keeps_the_used_selectors(self):
+        original = (Path(settings.STATICFILES_DIRS[0]) / 'bootstrap/css/bootstrap.min.css').read_text()
+        purged = (self.static_root / self.stylesheet_url().removeprefix('/static/')).read_text()
+        self.assertLess(len(purged), len(original) / 2)
+        for selector in ('.container', '.row', '.btn-primary', '.form-control', '.d-flex', '.flex-column',
+                         '.visually-hidden', '.list-group-item', '.text-muted', '.show'):
+            self.assertIn(selector, original)
+            self.assertRegex(purged, re.escape(selector) + r'[^\w-]', selector)
+        for selector in ('.carousel', '.navbar-toggler', '.offcanvas'):
+            self.assertIn(selector, original)
+            self.assertNotIn(selector, purged)
+
+    def test_compressed_files_are_served(self):
+        path = self.stylesheet_url().removeprefix('/static/')
+        request = RequestFactory().get('/static/' + path, headers={'accept-encoding': 'gzip, br'})
+        response = staticfiles.serve(request, path)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Cache-Control'], staticfiles.IMMUTABLE)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(content), (self.static_root / path).read_bytes())
+
+        response = staticfiles.serve(RequestFactory().get('/static/' + path), path)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), (self.static_root / path).read_bytes())
+
+
+class MetricsTests(TransactionTestCase):
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        identities.reset()
+        self.addCleanup(identities.reset)
+
+    def test_samples_belong_to_declared_families(self):
+        self.client.get(reverse('home'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+
+        families, samples = {}, []
+        for line in response.content.decode().splitlines():
+            if line.startswith('# TYPE '):
+                name, kind = line.split()[2:]
+                families[name] = kind
+            elif line and not line.startswith('#'):
+                samples.append(re.match(r'[a-zA-Z_:][\w:]*', line).group())
+        self.assertIn('chat_answer_cache_events_total', samples)
+        self.assertEqual(families['chat_answer_cache_events_total'], 'counter')
+        self.assertIn('histogram', families.values())
+        for sample in samples:
+            with self.subTest(sample=sample):
+                family = sample if sample in families else re.sub(r'_(bucket|sum|count)$', '', sample)
+                self.assertIn(family, families)
+                if family != sample:
+                    self.assertEqual(families[family], 'histogram')
@@ -0,0 +1,29 @@
+"""
+Token counting for prompt budgets.
+
+Uses tiktoken when it is installed; otherwise falls back to the usual
+~4 characters per token estimate, which is close enough for budgeting.
+"""
+import math
+from functools import lru_cache
+
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def _encoding():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(settings.LLM_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / 4)
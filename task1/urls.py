@@ -5,4 +5,10 @@ from . import views
 urlpatterns = [
     path('', home, name='home'),
     path('addpage', views.addpage, name='addpage'),
+    path('addpage/stream', views.addpage_stream, name='addpage_stream'),
+    path('jobs/<int:job_id>', views.job_status, name='job_status'),
+    path('messages', views.messages, name='messages'),
+    path('history', views.history, name='history'),
+    path('search', views.search_view, name='search'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
@@ -1,54 +1,241 @@
-from django.http import HttpResponse
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render
+from django.urls import reverse
+from django.views.decorators.http import condition
 from .forms import InputForm
-from openai import OpenAI
 
-from task1.models import Post
+from task1 import answer_cache, jobs, metrics
+from task1.admission import acquire_llm_slot, release_llm_slot, too_many_requests
+from task1.answers import SYSTEM_PROMPT, stream_answer
+from task1.context import prompt_history
+from task1.identities import current_author, current_conversation, get_bot
+from task1.models import Job, Post
+from task1.pagination import PAGE_SIZE, history_page
+from task1.querybudget import query_budget
+from task1.search import search
 from django.utils import timezone
-from django.contrib.auth.models import User
 
+LONG_POLL_INTERVAL = 0.25  # как часто job_status перечитывает задачу, секунды
 
-ME = User.objects.get(username='vladimir')
-BOT = User.objects.get(username='bot')
 
+def serialize_post(post):
+    return {
+        'id': post.id,
+        'author': str(post.author),
+        'text': post.text,
+        'published_date': post.published_date.isoformat() if post.published_date else None,
+    }
 
-def generate_answer(user_input):
-    client = OpenAI(
-        api_key="sk-KVD8VYoze5Ivy8BFwfV9KnCzdMvhnnyp",
-        base_url="https://api.proxyapi.ru/openai/v1",
-    )
 
-    completion = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system",
-             "content": ''},  # Тут нужно написать промт, выдающий роль помощника
-            {"role": "user",
-             "content": user_input}
-        ]
-    )
-    return completion.choices[0].message
+def conversation_posts(request):
+    return Post.objects.select_related('author').filter(conversation=current_conversation(request))
 
 
-def home(request):
+def render_chat(request, pending_job=None):
     context = {'form': InputForm()}
-    posts = Post.objects.all().order_by('published_date')
-    return render(request, "home.html", {'posts': posts, 'context': context})
+    posts, history_cursor = history_page(conversation_posts(request), conversation=current_conversation(request),
+                                         read_archive=False)
+    last_id = max((post.id for post in posts), default=0)
+    return render(request, "home.html", {'posts': posts, 'context': context, 'history_cursor': history_cursor,
+                                         'last_id': last_id, 'pending_job': pending_job,
+                                         'streaming': settings.CHAT_STREAMING})
+
+
+@query_budget(8)
+def home(request):
+    return render_chat(request)
+
+
+@query_budget(8)
+def history(request):
+    """
+    Older messages for the chat page: ?before=<cursor> returns the page of posts
+    that precede the cursor and the cursor for the next (older) page.
+    """
+    try:
+        posts, next_cursor = history_page(conversation_posts(request), request.GET.get('before'),
+                                          conversation=current_conversation(request))
+    except ValueError:
+        return HttpResponseBadRequest('Invalid cursor')
+    return JsonResponse({'posts': [serialize_post(post) for post in posts], 'next': next_cursor})
+
+
+def latest_post(request):
+    # Один запрос на оба условия (ETag и Last-Modified)
+    if not hasattr(request, '_latest_post'):
+        request._latest_post = (Post.objects.filter(conversation=current_conversation(request))
+                                .order_by('-id').values('id', 'published_date').first())
+    return request._latest_post
+
+
+def messages_etag(request):
+    latest = latest_post(request)
+    return str(latest['id']) if latest else '0'
+
+
+def messages_last_modified(request):
+    latest = latest_post(request)
+    return latest['published_date'] if latest else None
+
+
+@query_budget(8)
+@condition(etag_func=messages_etag, last_modified_func=messages_last_modified)
+def messages(request):
+    """
+    Posts newer than ?after=<id>, oldest first, for incremental updates of the
+    chat page. Validators come from the newest Post, so a poll with nothing new
+    is answered with 304 Not Modified after a single indexed lookup.
+    """
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        return HttpResponseBadRequest('Invalid id')
+    posts = list(conversation_posts(request).filter(id__gt=after).order_by('id')[:PAGE_SIZE + 1])
+    response = JsonResponse({'posts': [serialize_post(post) for post in posts[:PAGE_SIZE]],
+                             'more': len(posts) > PAGE_SIZE})
+    response['Cache-Control'] = 'no-cache'
+    return response
+
 
+@query_budget(5)
+def search_view(request):
+    """
+    Full-text search over the chat: ?q=<words>[&limit=N], best matches first.
+    """
+    try:
+        limit = int(request.GET.get('limit', 20))
+    except ValueError:
+        return HttpResponseBadRequest('Invalid limit')
+    # LIMIT -1 в SQLite снимает ограничение вовсе
+    if limit < 1:
+        return HttpResponseBadRequest('Invalid limit')
+    limit = min(limit, PAGE_SIZE)
+    results = search(request.GET.get('q', ''), limit, conversation=current_conversation(request))
+    return JsonResponse({'posts': [{**serialize_post(post), 'snippet': post.snippet} for post in results]})
 
+
+@query_budget(15)
 def addpage(request):
     if request.method == 'POST':
-        context = {'form': InputForm()}
-
         text = str(request.POST['field_text'])
-        Post.objects.create(author=ME, text=text, published_date=timezone.now())
-        answer = generate_answer(text)
-        answer_dict = {"POST": "ok", "answer": list(answer)[0][1]}
+        post = Post.objects.create(author=current_author(request), conversation=current_conversation(request),
+                                   text=text, published_date=timezone.now())
+        # Ответ генерируют воркеры (run_llm_workers), страница ждёт его через job_status
+        job = jobs.enqueue(post)
 
-        Post.objects.create(author=BOT, text=answer_dict["answer"], published_date=timezone.now())
-        posts = Post.objects.all().order_by('published_date')
-
-        return render(request, "home.html", {'posts': posts, 'context': context})
+        if 'application/json' in request.headers.get('Accept', ''):
+            return JsonResponse({'post': serialize_post(post), 'job': job.pk,
+                                 'poll': reverse('job_status', args=[job.pk])}, status=202)
+        return render_chat(request, pending_job=job)
     else:
         form = InputForm()
     return render(request, 'home.html', {'form': form})
+
+
+@query_budget(None)
+async def job_status(request, job_id):
+    """
+    Long-poll for a queued answer: waits up to ?timeout= seconds (at most
+    LLM_JOB_POLL_TIMEOUT) for the job to finish, then returns its status and,
+    once it is done, the bot post.
+    """
+    try:
+        timeout = min(float(request.GET.get('timeout', settings.LLM_JOB_POLL_TIMEOUT)),
+                      settings.LLM_JOB_POLL_TIMEOUT)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid timeout')
+
+    conversation = await sync_to_async(current_conversation)(request)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            job = await Job.objects.select_related('answer__author').aget(pk=job_id, prompt__conversation=conversation)
+        except Job.DoesNotExist:
+            raise Http404('Job not found')
+        if job.status in (Job.DONE, Job.FAILED) or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(LONG_POLL_INTERVAL)
+
+    data = {'job': job.pk, 'status': job.status}
+    if job.status == Job.DONE and job.answer is not None:
+        data['post'] = serialize_post(job.answer)
+    elif job.status == Job.FAILED:
+        data['error'] = job.error
+    return JsonResponse(data)
+
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+@query_budget(24)
+async def addpage_stream(request):
+    """
+    Async variant of addpage: streams the bot answer as Server-Sent Events
+    (event "token" per chunk, then "done" with the saved post) instead of holding
+    a worker until the completion is finished. Serve it over ASGI
+    (pythonProject.asgi:application) to get the concurrency benefit.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    text = str(request.POST.get('field_text', ''))
+    if not text:
+        return HttpResponseBadRequest('field_text is required')
+    # Слот держится до конца потока и освобождается в events()
+    slot = await sync_to_async(acquire_llm_slot)()
+    if slot is None:
+        return too_many_requests(request, settings.ADMISSION_RETRY_AFTER)
+    author = await sync_to_async(current_author)(request)
+    conversation = await sync_to_async(current_conversation)(request)
+    bot = await sync_to_async(get_bot)()
+    user_post = await Post.objects.acreate(author=author, conversation=conversation, text=text,
+                                           published_date=timezone.now())
+    history = await sync_to_async(prompt_history)(user_post, SYSTEM_PROMPT)
+
+    async def events():
+        yield sse_event('post', serialize_post(user_post))
+        parts = []
+        try:
+            async for token in stream_answer(text, history):
+                parts.append(token)
+                yield sse_event('token', {'token': token})
+        except Exception as exc:
+            yield sse_event('error', {'error': str(exc)})
+        finally:
+            # Вызов LLM закончен; ответ сохраняется, даже если клиент закрыл соединение посреди потока
+            await asyncio.shield(sync_to_async(release_llm_slot)(slot))
+            bot_post = None
+            if parts:
+                bot_post = await asyncio.shield(
+                    Post.objects.acreate(author=bot, conversation=conversation, text=''.join(parts),
+                                         published_date=timezone.now()))
+        if bot_post is not None:
+            yield sse_event('done', serialize_post(bot_post))
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@query_budget(0)
+def metrics_view(request):
+    """
+    Request timing histograms and answer cache counters of this process, in the
+    Prometheus text exposition format.
+    """
+    cache_stats = answer_cache.stats()
+    size = cache_stats.pop('size')
+    lines = ['# TYPE chat_answer_cache_events_total counter']
+    lines += [f'chat_answer_cache_events_total{{event="{event}"}} {value}' for event, value in cache_stats.items()]
+    lines += ['# TYPE chat_answer_cache_size gauge', f'chat_answer_cache_size {size}']
+    body = metrics.registry.render() + '\n'.join(lines) + '\n'
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
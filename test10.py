@@ -1,7 +1,22 @@
 from enum import Enum
 from typing import Dict, Optional
 from collections import deque
+from array import array
+from bisect import bisect_left
+from heapq import heapify, heappop, heappush
+from itertools import count
+from multiprocessing import shared_memory
+from pathlib import Path
+import asyncio
+import gc
+import mmap
+import multiprocessing
+import os
+import pickle
+import struct
+import threading
 import time
+import zlib
 
 
 class ZoneQueueException(Exception):
@@ -30,12 +45,273 @@ class ZoneType(Enum):
     GREEN = 1
 
 
+# Upper bounds of the wait time histogram buckets, milliseconds
+WAIT_TIME_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 300000, 900000)
+
+
+class WaitTimeHistogram:
+    """
+    Fixed-bucket histogram of wait times: O(log buckets) per observation,
+    percentiles are estimated as the upper bound of the matching bucket
+    """
+
+    def __init__(self, buckets=WAIT_TIME_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.max = 0.0
+        self.cached_percentiles = {}
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+        self.cached_percentiles.clear()
+
+    def percentile(self, q: float) -> float:
+        if q not in self.cached_percentiles:
+            self.cached_percentiles[q] = self._percentile(q)
+        return self.cached_percentiles[q]
+
+    def _percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                # Последний бакет не ограничен сверху, берём максимум
+                return float(self.buckets[index]) if index < len(self.buckets) else self.max
+        return self.max
+
+
+ZONES_BY_PRIORITY = sorted(ZoneType, key=lambda z: z.value, reverse=True)
+ZONE_COUNT = len(ZoneType)
+# Код 0 в компактном хранилище означает свободный слот
+ITEM_TYPE_NAMES = (None, 'TRADE', 'RISK', 'REPORT')
+ITEM_TYPE_CODES = {name: code for code, name in enumerate(ITEM_TYPE_NAMES) if name}
+ITEM_TYPES = frozenset(ITEM_TYPE_CODES)
+
+
+def is_valid_item(item) -> bool:
+    """
+    Whether item is a dict with a str 'id', a known 'type', a dict 'data'
+    and a float 'timestamp' (milliseconds)
+    """
+    try:
+        return (isinstance(item, dict) and isinstance(item['id'], str) and item['type'] in ITEM_TYPES and
+                isinstance(item['data'], dict) and isinstance(item['timestamp'], float))
+    except (KeyError, TypeError):
+        return False  # Нет ключа или нехешируемый type
+
+
+class ZoneStorage:
+    """
+    Items of one zone in FIFO order, indexed by expiry deadline (timestamp +
+    zone timeout): entries [deadline, number, item] sit both in a deque and
+    in a min-heap. An entry removed from one of them stays in the other with
+    its item replaced by None, and is skipped when met
+    """
+
+    def __init__(self, capacity: int, timeout: int):
+        self.timeout = timeout
+        self.entries = deque()
+        self.expiry = []
+        self.sequence = count()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def push(self, item: dict) -> None:
+        entry = [item['timestamp'] + self.timeout, next(self.sequence), item]
+        self.entries.append(entry)
+        heappush(self.expiry, entry)
+        self.size += 1
+
+    def extend(self, items: list) -> None:
+        entries = [[item['timestamp'] + self.timeout, next(self.sequence), item] for item in items]
+        self.entries.extend(entries)
+        for entry in entries:
+            heappush(self.expiry, entry)
+        self.size += len(entries)
+
+    def popleft(self) -> Optional[tuple]:
+        """
+        Remove the oldest item; (item, deadline), or None if there is none
+        """
+        while self.entries:
+            entry = self.entries.popleft()
+            item = entry[2]
+            if item is not None:
+                entry[2] = None
+                self.size -= 1
+                self.compact()
+                return item, entry[0]
+        return None
+
+    def pop_expired(self, now: float) -> list:
+        """
+        Remove the items whose deadline is before `now`: O(log n) each
+        """
+        expired = []
+        while self.expiry and self.expiry[0][0] < now:
+            entry = heappop(self.expiry)
+            if entry[2] is not None:
+                expired.append(entry[2])
+                entry[2] = None
+        if expired:
+            self.size -= len(expired)
+            self.compact()
+        return expired
+
+    def items(self) -> list:
+        """
+        The queued items in FIFO order
+        """
+        return [entry[2] for entry in self.entries if entry[2] is not None]
+
+    def compact(self) -> None:
+        # Помеченные записи выбрасываем, когда их больше живых: амортизированно O(1)
+        limit = 2 * self.size + 64
+        if len(self.entries) > limit:
+            self.entries = deque(entry for entry in self.entries if entry[2] is not None)
+        if len(self.expiry) > limit:
+            self.expiry = [entry for entry in self.expiry if entry[2] is not None]
+            heapify(self.expiry)
+
+
+class CompactZoneStorage:
+    """
+    ZoneStorage with the items kept as columns of a preallocated ring buffer:
+    timestamps in an array of doubles, types as one-byte codes, ids and data
+    as plain references. No per-item dict is kept; one is built again on the
+    way out, with only the four item fields.
+
+    The ring has twice the zone size, so slots freed in the middle by expiry
+    are reclaimed by an occasional compaction, O(n) once per n pushes. The
+    expiry heap holds ints: the deadline in microseconds shifted left past
+    the slot number
+    """
+
+    def __init__(self, capacity: int, timeout: int):
+        self.timeout = timeout
+        self.capacity = 2 * max(capacity, 1)
+        self.slot_bits = self.capacity.bit_length()
+        self.slot_mask = (1 << self.slot_bits) - 1
+        self.timestamps = array('d', bytes(8 * self.capacity))
+        self.types = bytearray(self.capacity)
+        self.ids = [None] * self.capacity
+        self.data = [None] * self.capacity
+        self.expiry = []
+        # Позиции растут монотонно, слот = позиция % capacity
+        self.head = 0
+        self.tail = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def key(self, slot: int) -> int:
+        return int((self.timestamps[slot] + self.timeout) * 1000) << self.slot_bits | slot
+
+    def push(self, item: dict) -> None:
+        if self.tail - self.head == self.capacity:
+            self.compact_ring()
+        slot = self.tail % self.capacity
+        self.timestamps[slot] = item['timestamp']
+        self.types[slot] = ITEM_TYPE_CODES[item['type']]
+        self.ids[slot] = item['id']
+        self.data[slot] = item['data']
+        self.tail += 1
+        self.size += 1
+        heappush(self.expiry, self.key(slot))
+
+    def extend(self, items: list) -> None:
+        for item in items:
+            self.push(item)
+
+    def take(self, slot: int) -> dict:
+        item = {'id': self.ids[slot], 'type': ITEM_TYPE_NAMES[self.types[slot]], 'data': self.data[slot],
+                'timestamp': self.timestamps[slot]}
+        self.types[slot] = 0
+        self.ids[slot] = self.data[slot] = None
+        self.size -= 1
+        return item
+
+    def popleft(self) -> Optional[tuple]:
+        while self.head < self.tail:
+            slot = self.head % self.capacity
+            self.head += 1
+            if self.types[slot]:
+                deadline = self.timestamps[slot] + self.timeout
+                item = self.take(slot)
+                self.compact_expiry()
+                return item, deadline
+        return None
+
+    def pop_expired(self, now: float) -> list:
+        expired = []
+        heap = self.expiry
+        now_us = now * 1000
+        while heap and heap[0] >> self.slot_bits < now_us:
+            key = heap[0]
+            slot = key & self.slot_mask
+            # Ключ устарел, если слот освобождён или занят другим элементом с другим сроком
+            if self.types[slot] and self.key(slot) == key:
+                if self.timestamps[slot] + self.timeout >= now:
+                    break  # Срок округлён до микросекунд и ещё не наступил
+                expired.append(self.take(slot))
+            heappop(heap)
+        if expired:
+            self.compact_expiry()
+        return expired
+
+    def items(self) -> list:
+        items = []
+        for position in range(self.head, self.tail):
+            slot = position % self.capacity
+            if self.types[slot]:
+                items.append({'id': self.ids[slot], 'type': ITEM_TYPE_NAMES[self.types[slot]],
+                              'data': self.data[slot], 'timestamp': self.timestamps[slot]})
+        return items
+
+    def compact_expiry(self) -> None:
+        if len(self.expiry) > 2 * self.size + 64:
+            self.expiry = [key for key in self.expiry
+                           if self.types[key & self.slot_mask] and self.key(key & self.slot_mask) == key]
+            heapify(self.expiry)
+
+    def compact_ring(self) -> None:
+        """
+        Move the live items to the start of the ring, in order
+        """
+        slots = [position % self.capacity for position in range(self.head, self.tail)]
+        live = [(self.timestamps[slot], self.types[slot], self.ids[slot], self.data[slot])
+                for slot in slots if self.types[slot]]
+        self.types = bytearray(self.capacity)
+        self.ids = [None] * self.capacity
+        self.data = [None] * self.capacity
+        for slot, (timestamp, code, item_id, data) in enumerate(live):
+            self.timestamps[slot] = timestamp
+            self.types[slot] = code
+            self.ids[slot] = item_id
+            self.data[slot] = data
+        self.head, self.tail = 0, len(live)
+        self.expiry = [self.key(slot) for slot in range(len(live))]
+        heapify(self.expiry)
+
+
 class ZoneQueue:
     def __init__(self,
                  red_timeout: int = 60,
                  yellow_timeout: int = 300,
                  green_timeout: int = 900,
-                 max_zone_size: Dict[ZoneType, int] = None):
+                 max_zone_size: Dict[ZoneType, int] = None,
+                 wait_time_alpha: float = 0.1,
+                 compact: bool = False):
 
         self.red_timeout = red_timeout
         self.yellow_timeout = yellow_timeout
@@ -47,10 +323,9 @@ class ZoneQueue:
             ZoneType.GREEN: 500
         }
 
-        self.queues = {ZoneType.RED: deque(maxlen=self.max_zone_size[ZoneType.RED]),
-                       ZoneType.YELLOW: deque(maxlen=self.max_zone_size[ZoneType.YELLOW]),
-                       ZoneType.GREEN: deque(maxlen=self.max_zone_size[ZoneType.GREEN])
-                       }
+        storage = CompactZoneStorage if compact else ZoneStorage
+        self.queues = {zone: storage(self.max_zone_size[zone], self.get_zone_timeout(zone)) for zone in ZoneType}
+        self.expired_pending = []
 
         self.health_status = {
             'expired_items': 0,
@@ -63,6 +338,9 @@ class ZoneQueue:
                 ZoneType.GREEN: {'avg_wait_time': 0.0, 'current_items': 0, 'items_processed': 0, 'load_percentage': 0.0}
             }
         }
+        # Время ожидания (мс) усредняется экспоненциально и раскладывается по бакетам
+        self.wait_time_alpha = wait_time_alpha
+        self.wait_times = {zone: WaitTimeHistogram() for zone in ZoneType}
         """
                 Initialize queue zones and monitoring systems
 
@@ -76,18 +354,50 @@ class ZoneQueue:
                     Timeout in milliseconds for GREEN zone items
                 max_zone_size: Dict[ZoneType, int]
                     Maximum size for each zone
+                wait_time_alpha: float
+                    Weight of the newest sample in the average wait time (EWMA)
+                compact: bool
+                    Keep the items in array-backed ring buffers (CompactZoneStorage)
+                    instead of as dicts: several times less memory per item, but
+                    dequeue returns new dicts with only id, type, data and timestamp
+
+                An item expires once it has waited longer than its zone's
+                timeout. Expiry is indexed by a per-zone min-heap of deadlines
+                (timestamp + zone timeout), so cleanup_expired costs O(log n)
+                per expired item however deep the queue is, and dequeue skips
+                expired items instead of returning them
                 """
 
     def refresh_health_status(self, zone: ZoneType) -> None:
-        zone_queue = self.queues[zone]
-        current_load = len(zone_queue) / self.max_zone_size[zone] * 100
-
-        self.health_status['zones'][zone]['current_items'] = len(zone_queue)
-        self.health_status['zones'][zone]['load_percentage'] = current_load
-
-        total_load_percentage = sum(len(self.queues[zone]) / self.max_zone_size[zone] *
-                                    100 for zone in ZoneType) / len(ZoneType)
-        self.health_status['total_load_percentage'] = total_load_percentage
+        """
+        Update the metrics of a zone whose size changed, in O(1). The total
+        load is recomputed from the three zone loads rather than adjusted,
+        so it does not depend on the order of the operations
+        """
+        zones = self.health_status['zones']
+        zone_status = zones[zone]
+        current_items = len(self.queues[zone])
+        zone_status['current_items'] = current_items
+        zone_status['load_percentage'] = current_items / self.max_zone_size[zone] * 100
+        self.health_status['total_load_percentage'] = sum(
+            status['load_percentage'] for status in zones.values()) / ZONE_COUNT
+
+    def now(self) -> float:
+        """
+        Current time in milliseconds, the unit of item timestamps
+        """
+        return time.time() * 1000
+
+    def record_wait_time(self, zone: ZoneType, item: dict, now: Optional[float] = None) -> None:
+        if now is None:
+            now = self.now()
+        wait_time = max(now - item['timestamp'], 0.0)
+        zone_status = self.health_status['zones'][zone]
+        if zone_status['items_processed'] == 1:
+            zone_status['avg_wait_time'] = wait_time
+        else:
+            zone_status['avg_wait_time'] += self.wait_time_alpha * (wait_time - zone_status['avg_wait_time'])
+        self.wait_times[zone].observe(wait_time)
 
     def enqueue(self, item: dict, zone: ZoneType) -> None:
         """
@@ -102,20 +412,51 @@ class ZoneQueue:
         if len(self.queues[zone]) >= self.max_zone_size[zone]:
             raise QueueFullException
 
-        if not isinstance(item, dict):
+        if not is_valid_item(item):
             raise InvalidItemException  # Невалидная структура процесса
 
-        if ('id' not in item) or ('type' not in item) or ('data' not in item) or ('timestamp' not in item):
-            raise InvalidItemException
-
-        if ((not isinstance(item['id'], str)) or (item['type'] not in ['TRADE', 'RISK', 'REPORT']) or
-                (not isinstance(item['data'], dict)) or (not isinstance(item['timestamp'], float))):
-            raise InvalidItemException
-
-        self.queues[zone].append(item)
+        self.queues[zone].push(item)
         self.health_status['total_items'] += 1
         self.refresh_health_status(zone)
 
+    def enqueue_many(self, items, zone: ZoneType, partial: bool = False) -> list:
+        """
+        Add a batch of items to specified zone: one validation pass, one bulk
+        append and one health status update for the whole batch
+
+        By default the batch is all-or-nothing: QueueFullException if it does
+        not fit, InvalidItemException if any item is invalid, and nothing is
+        added. With partial=True the valid items are added while there is
+        room, and the rejected ones are returned, in their original order
+        """
+        if not isinstance(zone, ZoneType):
+            raise InvalidZoneException
+
+        if not isinstance(self.max_zone_size, dict):
+            raise InvalidZoneException
+
+        items = list(items)
+        free = self.max_zone_size[zone] - len(self.queues[zone])
+        if partial:
+            accepted, rejected = [], []
+            for item in items:
+                if len(accepted) < free and is_valid_item(item):
+                    accepted.append(item)
+                else:
+                    rejected.append(item)
+        else:
+            if len(items) > free:
+                raise QueueFullException
+            if not all(map(is_valid_item, items)):
+                raise InvalidItemException
+            accepted, rejected = items, []
+
+        if accepted:
+            self.queues[zone].extend(accepted)
+            self.health_status['total_items'] += len(accepted)
+            self.refresh_health_status(zone)
+        return rejected
+
     def get_zone_timeout(self, zone: ZoneType) -> int:
         if zone == ZoneType.RED:
             return self.red_timeout
@@ -131,46 +472,947 @@ class ZoneQueue:
         Returns:
         --------
         dict or None
-            Highest priority non-expired item, or None if queue is empty
+            Highest priority non-expired item, or None if queue is empty.
+            Expired items met on the way are removed and counted as expired
         """
-        for zone in sorted(ZoneType, key=lambda z: z.value, reverse=True):
-            if self.queues[zone]:
+        now = self.now()
+        for zone in ZONES_BY_PRIORITY:
+            queue = self.queues[zone]
+            while (popped := queue.popleft()) is not None:
+                item, deadline = popped
                 self.health_status['total_items'] -= 1
+                if deadline < now:
+                    # Истёкший элемент не выдаём: его вернёт следующий cleanup_expired
+                    self.expired_pending.append(item)
+                    self.health_status['expired_items'] += 1
+                    self.refresh_health_status(zone)
+                    continue
                 self.health_status['zones'][zone]['items_processed'] += 1
+                self.record_wait_time(zone, item, now)
                 self.refresh_health_status(zone)
-                return self.queues[zone].popleft()
+                return item
         return None
 
+    def dequeue_batch(self, n: int) -> list:
+        """
+        Remove and return up to n highest priority non-expired items: the
+        zones are drained in priority order, and the health status of each
+        zone is updated once. Expired items met on the way are skipped as in
+        dequeue
+        """
+        items = []
+        now = self.now()
+        for zone in ZONES_BY_PRIORITY:
+            queue = self.queues[zone]
+            zone_status = self.health_status['zones'][zone]
+            taken = expired = 0
+            while len(items) < n and (popped := queue.popleft()) is not None:
+                item, deadline = popped
+                taken += 1
+                if deadline < now:
+                    self.expired_pending.append(item)
+                    expired += 1
+                    continue
+                items.append(item)
+                zone_status['items_processed'] += 1
+                self.record_wait_time(zone, item, now)
+            if taken:
+                self.health_status['total_items'] -= taken
+                self.health_status['expired_items'] += expired
+                self.refresh_health_status(zone)
+            if len(items) >= n:
+                break
+        return items
+
     def get_health_status(self) -> dict:
         """
                     Return queue health metrics:
                     - Items per zone
-                    - Average waiting time per zone
+                    - Average waiting time per zone (EWMA, ms) and its p50/p95/p99
                     - Number of expired items
                     - Current load percentage per zone
+
+                    The metrics are maintained on every operation; this returns a
+                    snapshot copy, cheap enough to poll at high frequency
                     """
-        return self.health_status
+        zones = {}
+        for zone, zone_status in self.health_status['zones'].items():
+            histogram = self.wait_times[zone]
+            zones[zone] = {**zone_status,
+                           'wait_time_p50': histogram.percentile(0.50),
+                           'wait_time_p95': histogram.percentile(0.95),
+                           'wait_time_p99': histogram.percentile(0.99)}
+        return {**self.health_status, 'zones': zones}
+
+    def cleanup_expired(self) -> list:
+        """
+        Remove and return list of expired items, including those dequeue
+        skipped since the last call. Only the expired heap tops are touched:
+        O(log n) per expired item, nothing for the rest of the queue
+        """
+        expired_items, self.expired_pending = self.expired_pending, []
+        current_time = self.now()
+
+        for zone in ZoneType:
+            # Строго больше таймаута, как и в dequeue
+            removed = self.queues[zone].pop_expired(current_time)
+            if removed:
+                expired_items.extend(removed)
+                self.health_status['total_items'] -= len(removed)
+                self.health_status['expired_items'] += len(removed)
+                self.refresh_health_status(zone)
+
+        return expired_items
+
+
+class ThreadSafeZoneQueue(ZoneQueue):
+    """
+    ZoneQueue for many producer and consumer threads: every operation holds
+    one lock, and dequeue blocks on a condition variable instead of polling
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.reaper = None
+        self.reaper_stop = threading.Event()
+
+    def enqueue(self, item: dict, zone: ZoneType) -> None:
+        with self.lock:
+            super().enqueue(item, zone)
+            self.not_empty.notify()
+
+    def enqueue_many(self, items, zone: ZoneType, partial: bool = False) -> list:
+        items = list(items)
+        with self.lock:
+            rejected = super().enqueue_many(items, zone, partial)
+            self.not_empty.notify(len(items) - len(rejected))
+        return rejected
+
+    def wait_and_take(self, take, block: bool, timeout: Optional[float]):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.not_empty:
+            while True:
+                taken = take()
+                if taken or not block:
+                    return taken
+                # Все элементы оказались истёкшими: ждём дальше в пределах того же таймаута
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return taken
+                self.not_empty.wait_for(lambda: self.health_status['total_items'] > 0, remaining)
+
+    def dequeue(self, block: bool = True, timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        Remove and return highest priority item, waiting up to `timeout`
+        seconds (forever if None) for one to arrive; None on timeout or, with
+        block=False, if the queue is empty
+        """
+        return self.wait_and_take(super().dequeue, block, timeout)
+
+    def dequeue_batch(self, n: int, block: bool = True, timeout: Optional[float] = None) -> list:
+        """
+        Remove and return up to n highest priority items, waiting as dequeue
+        does for at least one; an empty list on timeout
+        """
+        if n <= 0:
+            return []
+        return self.wait_and_take(lambda: super(ThreadSafeZoneQueue, self).dequeue_batch(n), block, timeout)
+
+    def get_health_status(self) -> dict:
+        with self.lock:
+            return super().get_health_status()
+
+    def cleanup_expired(self) -> list:
+        with self.lock:
+            return super().cleanup_expired()
+
+    def start_reaper(self, interval: float = 1.0, on_expired=None) -> None:
+        """
+        Run cleanup_expired every `interval` seconds in a daemon thread,
+        passing each non-empty batch of expired items to `on_expired`
+        """
+        if self.reaper is not None:
+            return
+        self.reaper_stop.clear()
+
+        def reap():
+            while not self.reaper_stop.wait(interval):
+                expired = self.cleanup_expired()
+                if expired and on_expired is not None:
+                    on_expired(expired)
+
+        self.reaper = threading.Thread(target=reap, name='zone-queue-reaper', daemon=True)
+        self.reaper.start()
+
+    def stop_reaper(self) -> None:
+        if self.reaper is not None:
+            self.reaper_stop.set()
+            self.reaper.join()
+            self.reaper = None
+
+
+class AsyncZoneQueue(ZoneQueue):
+    """
+    ZoneQueue for asyncio tasks of one event loop: enqueue wakes one waiting
+    consumer, `await dequeue()` suspends until an item arrives
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.getters = deque()
+        self.reaper = None
+
+    def wakeup_next(self) -> None:
+        while self.getters:
+            getter = self.getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+                break
+
+    def enqueue(self, item: dict, zone: ZoneType) -> None:
+        super().enqueue(item, zone)
+        self.wakeup_next()
+
+    def enqueue_many(self, items, zone: ZoneType, partial: bool = False) -> list:
+        items = list(items)
+        rejected = super().enqueue_many(items, zone, partial)
+        for _ in range(len(items) - len(rejected)):
+            if not self.getters:
+                break
+            self.wakeup_next()
+        return rejected
+
+    async def wait_and_take(self, take, timeout: Optional[float]):
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            taken = take()
+            if taken:
+                return taken
+            # Пусто (или остались только истёкшие): ждём следующий enqueue
+            while self.health_status['total_items'] == 0:
+                getter = loop.create_future()
+                self.getters.append(getter)
+                try:
+                    if deadline is None:
+                        await getter
+                    else:
+                        await asyncio.wait_for(getter, max(deadline - loop.time(), 0))
+                except BaseException as exc:
+                    getter.cancel()
+                    if getter in self.getters:
+                        self.getters.remove(getter)
+                    # Пробуждение могло достаться этому потребителю: передаём его следующему
+                    if self.health_status['total_items'] > 0:
+                        self.wakeup_next()
+                    if isinstance(exc, asyncio.TimeoutError):
+                        return taken
+                    raise
+
+    async def dequeue(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        Remove and return highest priority item, waiting up to `timeout`
+        seconds (forever if None); None on timeout
+        """
+        return await self.wait_and_take(super().dequeue, timeout)
+
+    async def dequeue_batch(self, n: int, timeout: Optional[float] = None) -> list:
+        """
+        Remove and return up to n highest priority items, waiting as dequeue
+        does for at least one; an empty list on timeout
+        """
+        if n <= 0:
+            return []
+        return await self.wait_and_take(lambda: super(AsyncZoneQueue, self).dequeue_batch(n), timeout)
+
+    def start_reaper(self, interval: float = 1.0, on_expired=None) -> None:
+        """
+        Run cleanup_expired every `interval` seconds in a task of the running
+        loop, passing each non-empty batch of expired items to `on_expired`
+        """
+        if self.reaper is not None:
+            return
+
+        async def reap():
+            while True:
+                await asyncio.sleep(interval)
+                expired = self.cleanup_expired()
+                if expired and on_expired is not None:
+                    on_expired(expired)
+
+        self.reaper = asyncio.get_running_loop().create_task(reap())
+
+    async def stop_reaper(self) -> None:
+        if self.reaper is not None:
+            self.reaper.cancel()
+            try:
+                await self.reaper
+            except asyncio.CancelledError:
+                pass
+            self.reaper = None
+
+
+# Заголовок шарда: head, tail, items_processed, expired_items, avg_wait_time, max wait time
+SHARD_HEADER = struct.Struct('<QQqqdd')
+EXPIRED_FIELD = struct.calcsize('<QQq')
+HISTOGRAM_COUNT = struct.Struct('<q')
+HISTOGRAM_SIZE = HISTOGRAM_COUNT.size * (len(WAIT_TIME_BUCKETS) + 1)
+# Заголовок слота: timestamp, код типа, длина id, длина data; дальше id (utf-8) и data (pickle)
+SLOT_HEADER = struct.Struct('<dBHI')
+
+
+class SharedZoneQueue:
+    """
+    ZoneQueue shared by processes on one machine, without a broker: every
+    zone is split into `shards` ring buffers of fixed-size slots in one
+    multiprocessing.shared_memory block, each with its own lock. Producers
+    spread over the shards of a zone, and consumers scan RED, then YELLOW,
+    then GREEN shards, so priority holds across processes. Order within a
+    zone is FIFO per shard only.
+
+    The health counters (processed, expired, wait time EWMA and histogram)
+    also live in the shard headers and are summed by get_health_status. A
+    semaphore counts the queued items so that a blocking dequeue sleeps
+    instead of polling.
+
+    Create the queue in the parent process and pass it to the workers as a
+    Process argument; the creator calls unlink() when done. Items are stored
+    as id, type, timestamp and the pickled data; one must fit in slot_size
+    bytes. Expired items met by dequeue are dropped and counted as expired.
+    """
+
+    def __init__(self,
+                 red_timeout: int = 60,
+                 yellow_timeout: int = 300,
+                 green_timeout: int = 900,
+                 max_zone_size: Dict[ZoneType, int] = None,
+                 wait_time_alpha: float = 0.1,
+                 shards: int = 4,
+                 slot_size: int = 256):
+        self.red_timeout = red_timeout
+        self.yellow_timeout = yellow_timeout
+        self.green_timeout = green_timeout
+        self.max_zone_size = max_zone_size or {
+            ZoneType.RED: 100,
+            ZoneType.YELLOW: 250,
+            ZoneType.GREEN: 500
+        }
+        self.wait_time_alpha = wait_time_alpha
+        self.shards = shards
+        self.slot_size = slot_size
+
+        # (смещение, ёмкость) каждого шарда; остаток от деления размера зоны достаётся первым шардам,
+        # так что в сумме зона вмещает ровно max_zone_size
+        self.layout = {}
+        size = 0
+        for zone in ZoneType:
+            base, remainder = divmod(self.max_zone_size[zone], shards)
+            self.layout[zone] = []
+            for shard in range(shards):
+                capacity = base + (shard < remainder)
+                self.layout[zone].append((size, capacity))
+                size += SHARD_HEADER.size + HISTOGRAM_SIZE + capacity * slot_size
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        self.locks = {zone: [multiprocessing.Lock() for _ in range(shards)] for zone in ZoneType}
+        self.available = multiprocessing.Semaphore(0)
+        self.next_shard = count(os.getpid())
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['next_shard']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.next_shard = count(os.getpid())
+
+    def close(self) -> None:
+        self.memory.close()
+
+    def unlink(self) -> None:
+        self.memory.unlink()
+
+    def get_zone_timeout(self, zone: ZoneType) -> int:
+        if zone == ZoneType.RED:
+            return self.red_timeout
+        elif zone == ZoneType.YELLOW:
+            return self.yellow_timeout
+        elif zone == ZoneType.GREEN:
+            return self.green_timeout
+
+    def slot_offset(self, offset: int, capacity: int, position: int) -> int:
+        return offset + SHARD_HEADER.size + HISTOGRAM_SIZE + position % capacity * self.slot_size
+
+    def enqueue(self, item: dict, zone: ZoneType) -> None:
+        """
+        Add item to specified zone, in the first shard with room
+        """
+        if not isinstance(zone, ZoneType):
+            raise InvalidZoneException
+
+        if not is_valid_item(item):
+            raise InvalidItemException
+
+        item_id = item['id'].encode()
+        data = pickle.dumps(item['data'], pickle.HIGHEST_PROTOCOL)
+        if SLOT_HEADER.size + len(item_id) + len(data) > self.slot_size:
+            raise InvalidItemException  # Элемент не помещается в слот
+        record = SLOT_HEADER.pack(item['timestamp'], ITEM_TYPE_CODES[item['type']], len(item_id), len(data))
+        record += item_id + data
+
+        buffer = self.memory.buf
+        start = next(self.next_shard)
+        for k in range(self.shards):
+            shard = (start + k) % self.shards
+            offset, capacity = self.layout[zone][shard]
+            with self.locks[zone][shard]:
+                head, tail = struct.unpack_from('<QQ', buffer, offset)
+                if tail - head < capacity:
+                    slot = self.slot_offset(offset, capacity, tail)
+                    buffer[slot:slot + len(record)] = record
+                    struct.pack_into('<Q', buffer, offset + 8, tail + 1)
+                    self.available.release()
+                    return
+        raise QueueFullException
+
+    def decode(self, record: bytes) -> dict:
+        timestamp, code, id_length, data_length = SLOT_HEADER.unpack_from(record)
+        start = SLOT_HEADER.size
+        return {'id': record[start:start + id_length].decode(), 'type': ITEM_TYPE_NAMES[code],
+                'data': pickle.loads(record[start + id_length:start + id_length + data_length]),
+                'timestamp': timestamp}
+
+    def read_slot(self, slot: int) -> bytes:
+        buffer = self.memory.buf
+        _, _, id_length, data_length = SLOT_HEADER.unpack_from(buffer, slot)
+        return bytes(buffer[slot:slot + SLOT_HEADER.size + id_length + data_length])
+
+    def record_wait_time(self, offset: int, wait_time: float) -> None:
+        # Вызывается под блокировкой шарда
+        buffer = self.memory.buf
+        head, tail, processed, expired, avg_wait_time, max_wait_time = SHARD_HEADER.unpack_from(buffer, offset)
+        processed += 1
+        if processed == 1:
+            avg_wait_time = wait_time
+        else:
+            avg_wait_time += self.wait_time_alpha * (wait_time - avg_wait_time)
+        SHARD_HEADER.pack_into(buffer, offset, head, tail, processed, expired, avg_wait_time,
+                               max(max_wait_time, wait_time))
+        bucket = offset + SHARD_HEADER.size + HISTOGRAM_COUNT.size * bisect_left(WAIT_TIME_BUCKETS, wait_time)
+        HISTOGRAM_COUNT.pack_into(buffer, bucket, HISTOGRAM_COUNT.unpack_from(buffer, bucket)[0] + 1)
+
+    def take(self, zone: ZoneType, shard: int, now: float) -> tuple:
+        """
+        Pop the first non-expired item of a shard: (record or None, items
+        removed). Expired items before it are dropped and counted
+        """
+        buffer = self.memory.buf
+        offset, capacity = self.layout[zone][shard]
+        timeout = self.get_zone_timeout(zone)
+        removed = 0
+        with self.locks[zone][shard]:
+            head, tail = struct.unpack_from('<QQ', buffer, offset)
+            while head < tail:
+                slot = self.slot_offset(offset, capacity, head)
+                timestamp = SLOT_HEADER.unpack_from(buffer, slot)[0]
+                head += 1
+                removed += 1
+                struct.pack_into('<Q', buffer, offset, head)
+                if timestamp + timeout < now:
+                    expired = struct.unpack_from('<q', buffer, offset + EXPIRED_FIELD)[0]
+                    struct.pack_into('<q', buffer, offset + EXPIRED_FIELD, expired + 1)
+                    continue
+                record = self.read_slot(slot)
+                self.record_wait_time(offset, max(now - timestamp, 0.0))
+                return record, removed
+        return None, removed
+
+    def consume_permits(self, removed: int, held: bool) -> None:
+        # Каждый снятый элемент забирает одно разрешение семафора; одно уже взято блокирующим ожиданием
+        for _ in range(removed - held):
+            self.available.acquire(False)
+
+    def dequeue(self, block: bool = True, timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        Remove and return highest priority non-expired item, waiting up to
+        `timeout` seconds (forever if None) for one to arrive; None on
+        timeout or, with block=False, if the queue is empty
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            held = False
+            if block:
+                remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+                if not self.available.acquire(timeout=remaining):
+                    return None
+                held = True
+            now = time.time() * 1000
+            start = next(self.next_shard)
+            for zone in ZONES_BY_PRIORITY:
+                for k in range(self.shards):
+                    record, removed = self.take(zone, (start + k) % self.shards, now)
+                    if removed:
+                        self.consume_permits(removed, held)
+                        held = False
+                    if record is not None:
+                        return self.decode(record)
+            if not block:
+                return None
+            # Разрешение относилось к элементу, который снял другой процесс: ждём следующее
 
     def cleanup_expired(self) -> list:
         """
-        Remove and return list of expired items
+        Remove and return every expired item, wherever it is in its shard.
+        Each shard is scanned once under its lock, and the items left are
+        moved up in place, keeping their order: O(shard size) per call, so
+        run it from a periodic reaper rather than per operation
         """
         expired_items = []
+        buffer = self.memory.buf
         current_time = time.time() * 1000
+        for zone in ZoneType:
+            timeout = self.get_zone_timeout(zone)
+            for shard, (offset, capacity) in enumerate(self.layout[zone]):
+                records = []
+                with self.locks[zone][shard]:
+                    head, tail = struct.unpack_from('<QQ', buffer, offset)
+                    kept = head
+                    for position in range(head, tail):
+                        slot = self.slot_offset(offset, capacity, position)
+                        if SLOT_HEADER.unpack_from(buffer, slot)[0] + timeout < current_time:
+                            records.append(self.read_slot(slot))
+                            continue
+                        if kept != position:
+                            target = self.slot_offset(offset, capacity, kept)
+                            buffer[target:target + self.slot_size] = buffer[slot:slot + self.slot_size]
+                        kept += 1
+                    if records:
+                        struct.pack_into('<Q', buffer, offset + 8, kept)
+                        expired = struct.unpack_from('<q', buffer, offset + EXPIRED_FIELD)[0]
+                        struct.pack_into('<q', buffer, offset + EXPIRED_FIELD, expired + len(records))
+                self.consume_permits(len(records), False)
+                expired_items.extend(self.decode(record) for record in records)
+        return expired_items
 
+    def get_health_status(self) -> dict:
+        """
+        Return queue health metrics in the ZoneQueue format, summed over the
+        shards. Read without the locks: a consistent enough snapshot to poll
+        """
+        buffer = self.memory.buf
+        status = {'expired_items': 0, 'total_items': 0, 'total_load_percentage': 0.0, 'zones': {}}
         for zone in ZoneType:
-            while self.queues[zone]:
-                item = self.queues[zone][0]
-                if current_time - item['timestamp'] > self.get_zone_timeout(zone):
-                    expired_items.append(self.queues[zone].popleft())
-                    self.health_status['total_items'] -= 1
-                    self.health_status['expired_items'] += 1
-                    self.refresh_health_status(zone)
+            histogram = WaitTimeHistogram()
+            current_items = processed = 0
+            weighted_wait_time = 0.0
+            for offset, _ in self.layout[zone]:
+                head, tail, shard_processed, expired, avg_wait_time, max_wait_time = \
+                    SHARD_HEADER.unpack_from(buffer, offset)
+                current_items += tail - head
+                processed += shard_processed
+                weighted_wait_time += avg_wait_time * shard_processed
+                status['expired_items'] += expired
+                counts = struct.unpack_from(f'<{len(WAIT_TIME_BUCKETS) + 1}q', buffer, offset + SHARD_HEADER.size)
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.max = max(histogram.max, max_wait_time)
+            histogram.count = sum(histogram.counts)
+            load_percentage = current_items / self.max_zone_size[zone] * 100
+            status['total_items'] += current_items
+            status['total_load_percentage'] += load_percentage / ZONE_COUNT
+            status['zones'][zone] = {
+                'avg_wait_time': weighted_wait_time / processed if processed else 0.0,
+                'current_items': current_items,
+                'items_processed': processed,
+                'load_percentage': load_percentage,
+                'wait_time_p50': histogram.percentile(0.50),
+                'wait_time_p95': histogram.percentile(0.95),
+                'wait_time_p99': histogram.percentile(0.99),
+            }
+        return status
+
+
+# Заголовок записи журнала: длина и crc32 полезной нагрузки
+LOG_RECORD = struct.Struct('<II')
+
+
+def fsync_directory(directory: Path) -> None:
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class SegmentLog:
+    """
+    Append-only log split into numbered segment files (00000001.log, ...),
+    each preallocated to segment_size bytes and memory-mapped. A record is
+    its length, its crc32 and the payload; a zero length or a bad checksum
+    (a torn write) ends a segment.
+
+    Appends only copy into the mapping, so they survive a crash of the
+    process at once. Surviving a crash of the machine takes an msync of the
+    appended range: after every append when commit_interval is 0, otherwise
+    once per commit_interval seconds from a background thread, for all the
+    records appended meanwhile (group commit).
+    """
+
+    def __init__(self, directory, number: int, segment_size: int = 64 * 1024 * 1024,
+                 commit_interval: float = 0.01):
+        self.directory = Path(directory)
+        self.segment_size = segment_size
+        self.commit_interval = commit_interval
+        self.lock = threading.Lock()
+        self.number = number - 1
+        self.open_segment()
+        self.closed = threading.Event()
+        self.flusher = None
+        if commit_interval > 0:
+            self.flusher = threading.Thread(target=self.flush_periodically, name='zone-queue-log', daemon=True)
+            self.flusher.start()
+
+    @staticmethod
+    def segment_path(directory, number: int) -> Path:
+        return Path(directory) / f'{number:08d}.log'
+
+    @staticmethod
+    def segment_numbers(directory) -> list:
+        return sorted(int(path.stem) for path in Path(directory).glob('*.log'))
+
+    @staticmethod
+    def read(path) -> list:
+        """
+        Payloads of the complete records of a segment file, as memoryviews
+        """
+        payloads = []
+        data = memoryview(Path(path).read_bytes())
+        position = 0
+        while position + LOG_RECORD.size <= len(data):
+            length, checksum = LOG_RECORD.unpack_from(data, position)
+            start = position + LOG_RECORD.size
+            payload = data[start:start + length]
+            if not length or len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            payloads.append(payload)
+            position = start + length
+        return payloads
+
+    def open_segment(self, size: int = 0) -> None:
+        self.number += 1
+        self.size = max(self.segment_size, size)
+        self.file = open(self.segment_path(self.directory, self.number), 'w+b')
+        self.file.truncate(self.size)
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+        self.position = self.synced = 0
+        fsync_directory(self.directory)
+
+    @staticmethod
+    def seal(segment: tuple) -> None:
+        """
+        Make a finished segment (file, map, position, synced) durable and close it
+        """
+        file, segment_map, position, synced = segment
+        if synced < position:
+            start = synced - synced % mmap.PAGESIZE
+            segment_map.flush(start, position - start)
+        segment_map.close()
+        # Хвост из нулей больше не нужен: закрытый сегмент обрезается до данных
+        file.truncate(position)
+        os.fsync(file.fileno())
+        file.close()
+
+    def seal_segment(self) -> None:
+        self.seal((self.file, self.map, self.position, self.synced))
+
+    def rotate(self) -> tuple:
+        """
+        Start the next segment without waiting for the disk. Returns its
+        number and the finished segment, which the caller must pass to seal()
+        """
+        with self.lock:
+            finished = (self.file, self.map, self.position, self.synced)
+            self.open_segment()
+            return self.number, finished
+
+    def append(self, payload: bytes) -> None:
+        record = LOG_RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+        with self.lock:
+            if self.position + len(record) > self.size:
+                self.seal_segment()
+                self.open_segment(len(record))
+            self.map[self.position:self.position + len(record)] = record
+            self.position += len(record)
+            if not self.commit_interval:
+                self.sync_range()
+
+    def sync_range(self) -> None:
+        # Вызывается под блокировкой; msync требует смещения, кратного странице
+        if self.synced < self.position:
+            start = self.synced - self.synced % mmap.PAGESIZE
+            self.map.flush(start, self.position - start)
+            self.synced = self.position
+
+    def sync(self) -> None:
+        with self.lock:
+            self.sync_range()
+
+    def flush_periodically(self) -> None:
+        while not self.closed.wait(self.commit_interval):
+            self.sync()
+
+    def close(self) -> None:
+        self.closed.set()
+        if self.flusher is not None:
+            self.flusher.join()
+        with self.lock:
+            self.seal_segment()
+
+
+def snapshot_paths(log_dir) -> list:
+    return sorted(Path(log_dir).glob('snapshot-*.pkl'))
+
+
+class ReplayedZoneQueue(ZoneQueue):
+    """
+    ZoneQueue rebuilt from a DurableZoneQueue log directory: the newest
+    snapshot plus the segments after it. Dequeue and cleanup records carry
+    the time they ran at, so expiry replays the same way. Used for recovery
+    and, on a private copy, to build compaction snapshots
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fixed_now = None
+
+    def now(self) -> float:
+        return self.fixed_now if self.fixed_now is not None else super().now()
+
+    def recover(self, log_dir, stop: Optional[int] = None) -> tuple:
+        """
+        Load the newest snapshot and replay the segments after it, up to but
+        not including segment `stop`; returns (first segment to keep, records
+        replayed)
+        """
+        first = 1
+        snapshots = snapshot_paths(log_dir)
+        if snapshots:
+            state = pickle.loads(snapshots[-1].read_bytes())
+            first = state['segment']
+            self.restore(state)
+        records = 0
+        # Добавления в разные зоны независимы: копим их по зонам до первого извлечения
+        # и применяем пачками, с одной проверкой и одним обновлением метрик на зону
+        pending = {zone.value: [] for zone in ZoneType}
+        for number in SegmentLog.segment_numbers(log_dir):
+            if number < first:
+                continue  # Уже в снимке, удаление прервал сбой
+            if stop is not None and number >= stop:
+                break
+            for payload in SegmentLog.read(SegmentLog.segment_path(log_dir, number)):
+                record = pickle.loads(payload)
+                records += 1
+                if record[0] == 'E':
+                    pending[record[1]].append(record[2])
+                elif record[0] == 'M':
+                    pending[record[1]].extend(record[2])
                 else:
-                    break
+                    self.apply_enqueued(pending)
+                    self.apply(record)
+        self.apply_enqueued(pending)
+        return first, records
 
+    def apply_enqueued(self, pending: dict) -> None:
+        for zone in ZoneType:
+            if pending[zone.value]:
+                ZoneQueue.enqueue_many(self, pending[zone.value], zone)
+                pending[zone.value] = []
+
+    def apply(self, record: tuple) -> None:
+        """
+        Replay a dequeue ('D', now), dequeue_batch ('B', now, n) or
+        cleanup_expired ('C', now) at the time it originally ran
+        """
+        operation, self.fixed_now = record[0], record[1]
+        try:
+            if operation == 'D':
+                ZoneQueue.dequeue(self)
+            elif operation == 'B':
+                ZoneQueue.dequeue_batch(self, record[2])
+            elif operation == 'C':
+                ZoneQueue.cleanup_expired(self)
+        finally:
+            self.fixed_now = None
+
+    def capture(self) -> dict:
+        return {
+            'queues': {zone.value: self.queues[zone].items() for zone in ZoneType},
+            'health_status': {**self.health_status,
+                              'zones': {zone: dict(status) for zone, status in self.health_status['zones'].items()}},
+            'wait_times': {zone.value: (list(histogram.counts), histogram.count, histogram.max)
+                           for zone, histogram in self.wait_times.items()},
+            'expired_pending': list(self.expired_pending),
+        }
+
+    def restore(self, state: dict) -> None:
+        for zone in ZoneType:
+            self.queues[zone].extend(state['queues'][zone.value])
+        self.health_status = state['health_status']
+        for zone in ZoneType:
+            histogram = self.wait_times[zone]
+            histogram.counts, histogram.count, histogram.max = state['wait_times'][zone.value]
+            histogram.cached_percentiles.clear()
+        self.expired_pending = state['expired_pending']
+
+
+class DurableZoneQueue(ReplayedZoneQueue):
+    """
+    ZoneQueue that survives a restart: every operation that changes the
+    queue is appended to a SegmentLog in log_dir, and a new DurableZoneQueue
+    on the same directory replays it, rebuilding the zones, health_status
+    and wait time histograms exactly. Reopen the log with the same timeouts
+    and zone sizes it was written with.
+
+    Once compact_after segments are sealed, the log moves on to a new
+    segment and a background thread replays the older ones into a private
+    ReplayedZoneQueue, writes its state as a snapshot and deletes the
+    segments it covers, so recovery reads one snapshot and the recent
+    segments. The live queue is never copied: the caller only opens the
+    next segment, and a second copy of the state exists in memory while
+    the snapshot is built.
+    Not thread-safe: one thread uses the queue, the log has its own lock for
+    the background sync.
+    """
+
+    def __init__(self, log_dir, *args, segment_size: int = 64 * 1024 * 1024, commit_interval: float = 0.01,
+                 compact_after: int = 4, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.options = (args, kwargs)
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.compact_after = compact_after
+        self.compactor = None
+
+        started = time.perf_counter()
+        # Восстановление создаёт миллионы объектов разом: сборщик мусора только мешает
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            first, records = self.recover(self.log_dir)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.recovery_stats = {'records': records, 'seconds': time.perf_counter() - started}
+        numbers = SegmentLog.segment_numbers(self.log_dir)
+        self.first_segment = first
+        self.log = SegmentLog(self.log_dir, (numbers[-1] if numbers else first - 1) + 1, segment_size,
+                              commit_interval)
+
+    # --- журналирование ---
+
+    def write(self, record: tuple) -> None:
+        self.log.append(pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+        if self.log.number - self.first_segment >= self.compact_after and not (
+                self.compactor and self.compactor.is_alive()):
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Start a new segment and snapshot the state it starts from in a
+        background thread; returns without waiting for the disk
+        """
+        segment, finished = self.log.rotate()
+        self.first_segment = segment
+        self.compactor = threading.Thread(target=self.write_snapshot, args=(segment, finished),
+                                          name='zone-queue-compactor')
+        self.compactor.start()
+
+    def write_snapshot(self, segment: int, finished: tuple) -> None:
+        """
+        Seal the finished segment, rebuild the state at the start of `segment`
+        from the log alone, write it as a snapshot and drop what it covers
+        """
+        SegmentLog.seal(finished)
+        # Состояние собирается из закрытых сегментов в отдельной очереди: живая очередь не копируется
+        args, kwargs = self.options
+        replica = ReplayedZoneQueue(*args, **kwargs)
+        replica.recover(self.log_dir, stop=segment)
+        state = replica.capture()
+        state['segment'] = segment
+        path = self.log_dir / f'snapshot-{segment:08d}.pkl'
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'wb') as snapshot:
+            pickle.dump(state, snapshot, pickle.HIGHEST_PROTOCOL)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(tmp, path)
+        fsync_directory(self.log_dir)
+        # Старое удаляем только после того, как снимок надёжно записан
+        for older in snapshot_paths(self.log_dir):
+            if older != path:
+                older.unlink()
+        for number in SegmentLog.segment_numbers(self.log_dir):
+            if number < segment:
+                SegmentLog.segment_path(self.log_dir, number).unlink()
+
+    def enqueue(self, item: dict, zone: ZoneType) -> None:
+        super().enqueue(item, zone)
+        self.write(('E', zone.value, item))
+
+    def enqueue_many(self, items, zone: ZoneType, partial: bool = False) -> list:
+        items = list(items)
+        rejected = super().enqueue_many(items, zone, partial)
+        if len(rejected) < len(items):
+            rejected_ids = {id(item) for item in rejected}
+            self.write(('M', zone.value, [item for item in items if id(item) not in rejected_ids]))
+        return rejected
+
+    def run_at_fixed_time(self, operation, *args):
+        total_items = self.health_status['total_items']
+        self.fixed_now = now = super().now()
+        try:
+            result = operation(*args)
+        finally:
+            self.fixed_now = None
+        return result, now, self.health_status['total_items'] != total_items
+
+    def dequeue(self) -> Optional[dict]:
+        item, now, changed = self.run_at_fixed_time(super().dequeue)
+        if changed:
+            self.write(('D', now))
+        return item
+
+    def dequeue_batch(self, n: int) -> list:
+        items, now, changed = self.run_at_fixed_time(super().dequeue_batch, n)
+        if changed:
+            self.write(('B', now, n))
+        return items
+
+    def cleanup_expired(self) -> list:
+        expired_items, now, _ = self.run_at_fixed_time(super().cleanup_expired)
+        if expired_items:
+            self.write(('C', now))
         return expired_items
 
+    def sync(self) -> None:
+        """
+        Make everything logged so far durable now, without waiting for the
+        group commit
+        """
+        self.log.sync()
+
+    def close(self) -> None:
+        if self.compactor is not None:
+            self.compactor.join()
+        self.log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
 
 # the second
 from dataclasses import dataclass
@@ -0,0 +1,138 @@
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from test10 import DurableZoneQueue, SegmentLog, ZoneType
+
+# Элементы не должны истечь, пока идёт тест и восстановление
+NO_EXPIRY = {'red_timeout': 10 ** 9, 'yellow_timeout': 10 ** 9, 'green_timeout': 10 ** 9}
+ZONES = list(ZoneType)
+
+
+def make_item(i):
+    return {'id': str(i), 'type': 'TRADE', 'data': {'n': i}, 'timestamp': time.time() * 1000}
+
+
+def state(queue):
+    return queue.get_health_status(), {zone: queue.queues[zone].items() for zone in ZoneType}
+
+
+class DurableZoneQueueTests(unittest.TestCase):
+    """
+    Recovery of DurableZoneQueue from its log directory. A crash is simulated
+    by dropping the queue without close(): appends are already in the shared
+    mapping, so another instance reads them from the files.
+    """
+
+    def setUp(self):
+        self.log_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.log_dir, ignore_errors=True)
+        self.opened = []
+        self.addCleanup(self.abandon)
+
+    def abandon(self):
+        # Брошенные очереди не закрываются: только останавливаем их потоки и отпускаем файлы
+        for queue in self.opened:
+            self.wait_for_compaction(queue)
+            log = queue.log
+            log.closed.set()
+            if log.flusher is not None:
+                log.flusher.join()
+            if not log.file.closed:
+                log.map.close()
+                log.file.close()
+
+    def open(self, queue_class=DurableZoneQueue, compact_after=2):
+        queue = queue_class(self.log_dir, segment_size=4096, compact_after=compact_after,
+                            max_zone_size={zone: 10000 for zone in ZoneType}, **NO_EXPIRY)
+        self.opened.append(queue)
+        return queue
+
+    def run_operations(self, queue, first, count):
+        for i in range(first, first + count):
+            queue.enqueue(make_item(i), ZONES[i % 3])
+            if i % 4 == 3:
+                queue.dequeue()
+        queue.dequeue_batch(3)
+
+    def wait_for_compaction(self, queue):
+        if queue.compactor is not None:
+            queue.compactor.join()
+
+    def test_replay_without_snapshot(self):
+        queue = self.open(compact_after=10 ** 6)
+        self.run_operations(queue, 0, 200)
+        expected = state(queue)
+
+        recovered = self.open()
+        self.assertEqual(state(recovered), expected)
+        self.assertFalse(list(self.log_dir.glob('snapshot-*')))
+
+    def test_snapshot_and_tail_replay(self):
+        queue = self.open()
+        self.run_operations(queue, 0, 400)
+        self.wait_for_compaction(queue)
+        snapshots = list(self.log_dir.glob('snapshot-*.pkl'))
+        self.assertEqual(len(snapshots), 1)
+        # Хвост после снимка: операции, которых в нём нет
+        self.run_operations(queue, 400, 20)
+        expected = state(queue)
+
+        recovered = self.open(compact_after=10 ** 6)
+        self.assertEqual(state(recovered), expected)
+        self.assertLess(recovered.recovery_stats['records'], 400)
+        first_kept = int(snapshots[0].stem.split('-')[1])
+        self.assertTrue(all(number >= first_kept for number in SegmentLog.segment_numbers(self.log_dir)))
+
+    def test_crash_before_snapshot_is_renamed(self):
+        class CrashingQueue(DurableZoneQueue):
+            def write_snapshot(self, segment, finished):
+                SegmentLog.seal(finished)
+                # Сбой посреди записи: остаётся только недописанный временный файл
+                (self.log_dir / f'snapshot-{segment:08d}.tmp').write_bytes(b'\x80\x05torn')
+
+        queue = self.open(CrashingQueue)
+        self.run_operations(queue, 0, 400)
+        self.wait_for_compaction(queue)
+        expected = state(queue)
+
+        recovered = self.open(compact_after=10 ** 6)
+        self.assertEqual(state(recovered), expected)
+
+    def test_crash_before_old_files_are_deleted(self):
+        queue = self.open(compact_after=10 ** 6)
+        self.run_operations(queue, 0, 200)
+        queue.compact_after = 2
+        with mock.patch.object(Path, 'unlink'):
+            self.run_operations(queue, 200, 200)
+            self.wait_for_compaction(queue)
+        queue.compact_after = 10 ** 6
+        self.run_operations(queue, 400, 20)
+        expected = state(queue)
+
+        recovered = self.open(compact_after=10 ** 6)
+        self.assertEqual(state(recovered), expected)
+        # Сегменты до снимка остались на диске, но повторно не применяются
+        self.assertIn(1, SegmentLog.segment_numbers(self.log_dir))
+
+    def test_compaction_does_not_share_items_with_the_queue(self):
+        queue = self.open()
+        self.run_operations(queue, 0, 400)
+        self.wait_for_compaction(queue)
+        # Элементы в очереди меняются после снимка; снимок собран из журнала и не должен это увидеть
+        for zone in ZoneType:
+            for item in queue.queues[zone].items():
+                item['data']['n'] = -1
+        queue.close()
+
+        recovered = self.open(compact_after=10 ** 6)
+        values = [item['data']['n'] for zone in ZoneType for item in recovered.queues[zone].items()]
+        self.assertTrue(values)
+        self.assertNotIn(-1, values)
+
+
+if __name__ == '__main__':
+    unittest.main()